@@ -0,0 +1,107 @@
+"""Latency benchmark of the gesture event bus.
+
+A subscriber process receives events published at a fixed rate and measures the delay between publish and
+receive with the shared monotonic clock. A second run publishes a burst to a subscriber that does not read,
+to check that a slow consumer only causes drops and never slows down the publisher.
+
+    python benchmarks/event_bus_latency.py --events 2000 --rate 500
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from GestureEventBus import (  # noqa: E402
+    EventType,
+    GestureEventPublisher,
+    GestureEventSubscriber,
+)
+
+
+def percentiles(samples):
+    p50, p95, p99 = np.percentile(samples, (50, 95, 99))
+    return "p50 {:.3f} ms  p95 {:.3f} ms  p99 {:.3f} ms  max {:.3f} ms".format(
+        p50, p95, p99, np.max(samples)
+    )
+
+
+def subscribe(directory, udp_port, count, ready, results, read):
+    with GestureEventSubscriber(directory, udp_port, buffer_size=4096) as subscriber:
+        ready.set()
+        if not read:
+            time.sleep(2.0)
+            return
+        latencies = []
+        while len(latencies) < count:
+            event = subscriber.receive(timeout=2.0)
+            if event is None:
+                break
+            latencies.append(1000.0 * (time.monotonic() - event.timestamp))
+        results.send((latencies, subscriber.lost))
+
+
+def run(count, rate, udp_port=None, read=True):
+    """Method for publishing count events at rate per second to a subscriber process
+
+    Returns:
+        (np.ndarray, List of float, int, int): Publish call times in ms, subscriber latencies in ms, events
+            lost by the subscriber and events dropped by the publisher
+    """
+    directory = tempfile.mkdtemp(prefix="visualcontroller-bench-")
+    ready = multiprocessing.Event()
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=subscribe, args=(directory, udp_port, count, ready, sender, read)
+    )
+    process.start()
+    ready.wait(10.0)
+    publisher = GestureEventPublisher(directory, udp_port)
+    publish_times = np.empty(count)
+    interval = 1.0 / rate if rate else 0.0
+    next_at = time.perf_counter()
+    for index in range(count):
+        if interval:
+            next_at += interval
+            while time.perf_counter() < next_at:
+                pass
+        start = time.perf_counter()
+        publisher.publish(EventType.ZOOM, a=float(index))
+        publish_times[index] = 1000.0 * (time.perf_counter() - start)
+    latencies, lost = receiver.recv() if read else ([], 0)
+    process.join()
+    publisher.close()
+    shutil.rmtree(directory, ignore_errors=True)
+    return publish_times, latencies, lost, publisher.dropped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the gesture event bus")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=500.0, help="Events per second")
+    parser.add_argument(
+        "--udp-port", type=int, default=None, help="Benchmark the UDP transport"
+    )
+    args = parser.parse_args()
+
+    publish_times, latencies, lost, dropped = run(args.events, args.rate, args.udp_port)
+    print("{} events at {:.0f}/s".format(args.events, args.rate))
+    print("publish call     " + percentiles(publish_times))
+    if latencies:
+        print("delivery latency " + percentiles(latencies))
+    print("lost {}, dropped {}".format(lost, dropped))
+
+    publish_times, _, _, dropped = run(args.events * 5, 0, args.udp_port, read=False)
+    print(
+        "burst of {} events to a subscriber that does not read".format(args.events * 5)
+    )
+    print("publish call     " + percentiles(publish_times))
+    print("dropped {}".format(dropped))
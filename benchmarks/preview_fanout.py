@@ -0,0 +1,145 @@
+"""CPU cost of the MJPEG preview server as the number of viewers grows.
+
+Synthetic composite frames are published at a fixed rate while viewer processes read the stream over
+localhost. The CPU time of the publishing process, which encodes and serves every viewer, should stay
+roughly flat: each frame is encoded once whatever the number of viewers. A last run adds a viewer that
+reads slowly, which should skip frames without slowing down the others.
+
+    python benchmarks/preview_fanout.py --viewers 0,1,2,4,8,16 --seconds 5
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from PreviewServer import PreviewServer  # noqa: E402
+
+
+def synthetic_composite(width, height):
+    """Method for building a camera-like frame with gradients and noise, so the JPEG size is realistic"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0 : 2 * width]
+    image = np.dstack([x * 255 // (2 * width), y * 255 // height, (x + y) % 256])
+    image = image + rng.integers(0, 24, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def view(port, quality, delay, ready, results):
+    connection = socket.create_connection(("127.0.0.1", port), timeout=10.0)
+    connection.sendall(
+        "GET /stream?quality={} HTTP/1.0\r\n\r\n".format(quality).encode()
+    )
+    stream = connection.makefile("rb")
+    while stream.readline().strip():
+        pass
+    # Reads until no frame came for a second, i.e. publishing stopped
+    connection.settimeout(1.0)
+    ready.release()
+    frames = 0
+    received = 0
+    while True:
+        try:
+            line = stream.readline()
+        except socket.timeout:
+            break
+        if not line:
+            break
+        if line.lower().startswith(b"content-length"):
+            size = int(line.split(b":")[1])
+            stream.readline()
+            received += len(stream.read(size))
+            frames += 1
+            if delay:
+                time.sleep(delay)
+    connection.close()
+    results.send((frames, received))
+
+
+def run(viewers, seconds, fps, width, height, quality="medium", slow_viewers=0):
+    """Method for publishing frames for seconds while viewers processes watch the stream
+
+    Returns:
+        dict: Publishing process CPU in percent of one core, encodes per second, frames per second received
+            by the fast and by the slow viewers
+    """
+    frame = synthetic_composite(width, height)
+    server = PreviewServer(port=0).start()
+    ready = multiprocessing.Semaphore(0)
+    processes = []
+    for index in range(viewers + slow_viewers):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        delay = 0.2 if index >= viewers else 0.0
+        process = multiprocessing.Process(
+            target=view,
+            args=(server.port, quality, delay, ready, sender),
+        )
+        process.start()
+        processes.append((process, receiver, delay))
+    for _ in processes:
+        ready.acquire(timeout=10.0)
+    deadline = time.monotonic() + 10.0
+    while server.viewers < len(processes) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    next_at = wall_start
+    while time.perf_counter() - wall_start < seconds:
+        server.publish(frame)
+        next_at += 1.0 / fps
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    encoded = sum(server.encoded.values())
+
+    fast, slow = [], []
+    for process, receiver, delay in processes:
+        frames, _ = receiver.recv()
+        process.join()
+        (slow if delay else fast).append(frames / wall)
+    server.close()
+    return {
+        "cpu": 100.0 * cpu / wall,
+        "encodes": encoded / wall,
+        "fast_fps": float(np.mean(fast)) if fast else 0.0,
+        "slow_fps": float(np.mean(slow)) if slow else 0.0,
+        "skipped": server.skipped,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the MJPEG preview fan-out")
+    parser.add_argument("--viewers", default="0,1,2,4,8,16")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--size", default="640x480", help="WIDTHxHEIGHT of one half")
+    parser.add_argument("--quality", default="medium")
+    args = parser.parse_args()
+    width, height = [int(value) for value in args.size.split("x")]
+
+    print(
+        "{}x{} composite at {:.0f} fps, quality {}".format(
+            2 * width, height, args.fps, args.quality
+        )
+    )
+    for viewers in [int(value) for value in args.viewers.split(",")]:
+        result = run(viewers, args.seconds, args.fps, width, height, args.quality)
+        print(
+            "{:3d} viewers  cpu {:5.1f}%  {:5.1f} encodes/s  {:5.1f} fps per viewer".format(
+                viewers, result["cpu"], result["encodes"], result["fast_fps"]
+            )
+        )
+    result = run(4, args.seconds, args.fps, width, height, args.quality, 1)
+    print(
+        "4 viewers and a slow one  cpu {:5.1f}%  fast {:.1f} fps, slow {:.1f} fps, {} frames skipped".format(
+            result["cpu"], result["fast_fps"], result["slow_fps"], result["skipped"]
+        )
+    )
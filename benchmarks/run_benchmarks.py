@@ -0,0 +1,427 @@
+"""Benchmarks of the per frame hot paths, runnable without camera or GPU.
+
+Every stage is timed on synthetic frames and fixed landmark fixtures at several resolutions. Results are
+printed as a table and can be saved as a JSON baseline; comparing against a baseline exits with status 1
+when the median latency of a stage regressed by more than the threshold.
+
+    python benchmarks/run_benchmarks.py --save baseline.json
+    python benchmarks/run_benchmarks.py --compare baseline.json --threshold 0.25
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from Gesture_util import GestureUtil, HandGesture, HandLandmark  # noqa: E402
+from GestureRegistry import finger_mask  # noqa: E402
+
+RESOLUTIONS = ((320, 240), (640, 480), (1280, 720))
+STROKE_LENGTHS = (10, 100, 1000)
+
+# Finger closed states (thumb, index, middle, ring, pinky) of each fixture
+GESTURE_FINGERS = {
+    HandGesture.OPEN: (False, False, False, False, False),
+    HandGesture.CLOSE: (True, True, True, True, True),
+    HandGesture.DRAW: (True, False, True, True, True),
+    HandGesture.ZOOM: (False, False, True, True, True),
+    HandGesture.ROTATE: (False, False, False, True, True),
+}
+
+
+def make_hand(gesture, center=(0.5, 0.6)):
+    """Method for building a fixed (21, 3) landmark fixture classified as the given gesture
+
+    Args:
+        gesture (HandGesture): Gesture the fixture must be classified as
+        center ((float, float)): Normalized position of the wrist
+
+    Returns:
+        np.ndarray: (21, 3) float32 landmarks
+    """
+    closed = GESTURE_FINGERS[gesture]
+    hand = np.zeros((21, 3), np.float32)
+    wrist_x, wrist_y = center
+    hand[HandLandmark.WRIST] = (wrist_x, wrist_y, 0.0)
+    # Thumb joints CMC, MCP, IP, TIP move left when open, right when folded
+    thumb_step = 0.03 if closed[0] else -0.03
+    for joint in range(1, 5):
+        hand[joint] = (wrist_x - 0.06 + thumb_step * joint, wrist_y - 0.04 * joint, 0)
+    # Finger joints MCP, PIP, DIP, TIP move up when open, down when folded
+    for finger in range(1, 5):
+        x = wrist_x - 0.045 + 0.03 * finger
+        mcp_y = wrist_y - 0.15
+        step = 0.03 if closed[finger] else -0.04
+        for joint in range(4):
+            hand[1 + 4 * finger + joint] = (x, mcp_y + step * joint, -0.01 * joint)
+    return hand
+
+
+def timeit(fn, iterations, warmup):
+    """Method for timing a callable
+
+    Returns:
+        dict: Iterations, throughput and mean/p50/p95/p99 latency in milliseconds
+    """
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(iterations)
+    for idx in range(iterations):
+        start = time.perf_counter_ns()
+        fn()
+        samples[idx] = time.perf_counter_ns() - start
+    samples /= 1e6
+    return {
+        "iterations": iterations,
+        "ops_per_s": 1000.0 / samples.mean(),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def synthetic_frame(width, height, seed=0):
+    """Method for building a deterministic textured BGR frame"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (height // 8 + 1, width // 8 + 1, 3), np.uint8)
+    return np.ascontiguousarray(
+        np.kron(small, np.ones((8, 8, 1), np.uint8))[:height, :width]
+    )
+
+
+def stroke_points(count, width, height):
+    angles = np.linspace(0, 4 * np.pi, count)
+    xs = width / 2 + width / 3 * np.cos(angles)
+    ys = height / 2 + height / 3 * np.sin(1.5 * angles)
+    return [(int(x), int(y)) for x, y in zip(xs, ys)]
+
+
+def chain_gesture(closed):
+    """The if/elif chain GestureUtil.determine_gesture used before the GestureRegistry, kept as reference
+
+    Args:
+        closed (List of bool): Closed state of thumb, index, middle, ring and pinky
+
+    Returns:
+        HandGesture: Gesture
+    """
+    thumb, index, middle, ring, pinky = closed
+    if thumb and index and middle and ring and pinky:
+        return HandGesture.CLOSE
+    elif not thumb and not index and middle and ring and pinky:
+        return HandGesture.ZOOM
+    elif not thumb and not index and not middle and ring and pinky:
+        return HandGesture.ROTATE
+    elif thumb and middle and ring and pinky and not index:
+        return HandGesture.DRAW
+    else:
+        return HandGesture.OPEN
+
+
+def gesture_benchmarks():
+    gesture_utils = GestureUtil(None)
+    registry = gesture_utils.registry
+    zoom_hand = make_hand(HandGesture.ZOOM)
+    batch = np.stack([make_hand(gesture) for gesture in GESTURE_FINGERS] * 200)
+    all_closed = [
+        [bool(mask & 1 << finger) for finger in range(5)] for mask in range(32)
+    ]
+    for mask, closed in enumerate(all_closed):
+        if registry.classify(mask) is not chain_gesture(closed):
+            raise AssertionError(
+                "Registry and if/elif chain differ on mask {}".format(mask)
+            )
+    silent = io.StringIO()
+
+    def chain_determine_gesture():
+        # Former implementation, including the print() it made on every call
+        with contextlib.redirect_stdout(silent):
+            closed = gesture_utils.fingers_closed(zoom_hand).tolist()
+            print()
+            chain_gesture(closed)
+        silent.seek(0)
+        silent.truncate()
+
+    def chain_all_masks():
+        for closed in all_closed:
+            chain_gesture(closed)
+
+    def lookup_all_masks():
+        for mask in range(32):
+            registry.classify(mask)
+
+    yield "gesture.determine_gesture", lambda: gesture_utils.determine_gesture(
+        zoom_hand
+    )
+    yield "gesture.determine_gesture[if/elif chain]", chain_determine_gesture
+    yield "gesture.classify[lookup, 32 masks]", lookup_all_masks
+    yield "gesture.classify[if/elif chain, 32 masks]", chain_all_masks
+    yield "gesture.finger_mask", lambda: finger_mask(
+        gesture_utils.fingers_closed(zoom_hand)
+    )
+    yield "gesture.get_angle", lambda: gesture_utils.get_angle(zoom_hand)
+    yield "gesture.classify_batch[1000]", lambda: gesture_utils.classify_batch(batch)
+
+
+def image_benchmarks(width, height):
+    from DrawingCanvas import DrawingCanvas
+    from ImageUtil import ImageUtils
+    from TransformEngine import TransformEngine
+
+    suffix = "@{}x{}".format(width, height)
+    image_utils = ImageUtils(None)
+    frame = synthetic_frame(width, height)
+    panel = np.zeros_like(frame)
+    hand = make_hand(HandGesture.ZOOM)
+
+    def zoom_image():
+        image_utils.zoom_scale = 0
+        image_utils.zoom_image(frame, 20)
+
+    yield "image.zoom_image" + suffix, zoom_image
+    yield "image.rotate_image" + suffix, lambda: image_utils.rotate_image(frame, 30)
+    yield "image.add_indicators" + suffix, lambda: image_utils.add_indicators(panel)
+    yield "image.draw_hand_landmarks" + suffix, lambda: image_utils.draw_hand_landmarks(
+        panel, hand
+    )
+    for length in STROKE_LENGTHS:
+        points = stroke_points(length, width, height)
+        yield "image.draw_on_screen[{}]{}".format(
+            length, suffix
+        ), lambda points=points: image_utils.draw_on_screen(panel, points)
+
+    transform = TransformEngine()
+    transform.add_zoom(20)
+    transform.set_rotation(30)
+    yield "transform.apply" + suffix, lambda: transform.apply(frame)
+
+    for length in STROKE_LENGTHS:
+        canvas = DrawingCanvas(max_points=max(STROKE_LENGTHS))
+        canvas.ensure_size(width, height)
+        for x, y in stroke_points(length, width, height):
+            canvas.add_point(x, y)
+        yield "canvas.blend[{}]{}".format(
+            length, suffix
+        ), lambda canvas=canvas: canvas.blend(panel)
+
+
+def controller_benchmarks(width, height):
+    from HandController import HandController
+
+    suffix = "@{}x{}".format(width, height)
+    controller = HandController()
+    controller.is_editable = True
+    # Keep the warp in the measured frame, the fixture's constant pinch does not change the zoom
+    controller.transform.set_rotation(15)
+    frame = synthetic_frame(width, height)
+    panel = np.zeros_like(frame)
+    left = make_hand(HandGesture.CLOSE, center=(0.25, 0.7))
+    right = make_hand(HandGesture.ZOOM, center=(0.7, 0.7))
+    hands_xyz = np.stack([left, right])
+    labels = ["Left", "Right"]
+
+    yield "controller.perform_right_hand_operation" + suffix, lambda: (
+        controller.perform_right_hand_operation(None, right, frame, panel)
+    )
+    yield "controller.render_landmarks" + suffix, lambda: controller.release_composite(
+        controller.render_landmarks(frame, hands_xyz, labels)
+    )
+    yield "controller.frame" + suffix, frame_loop(controller, frame, hands_xyz, labels)
+
+
+def frame_loop(controller, camera_frame, hands_xyz, labels):
+    """Method for building one iteration of the capture loop without camera, model and display:
+    preprocess and render_landmarks
+    """
+
+    def run_frame():
+        image = controller.preprocess(camera_frame)
+        controller.release_composite(
+            controller.render_landmarks(image, hands_xyz, labels)
+        )
+        controller.release_frame(image)
+
+    return run_frame
+
+
+def allocation_benchmarks(resolutions, frames=100, warmup=10):
+    """Method for measuring the memory allocated per frame by the capture loop once warmed up
+
+    Returns:
+        dict: Per resolution, new FramePool buffers per frame and peak transient bytes allocated within the
+            frames (numpy arrays are traced by tracemalloc)
+    """
+    from HandController import HandController
+
+    results = {}
+    left = make_hand(HandGesture.CLOSE, center=(0.25, 0.7))
+    right = make_hand(HandGesture.ZOOM, center=(0.7, 0.7))
+    hands_xyz = np.stack([left, right])
+    for width, height in resolutions:
+        controller = HandController()
+        controller.is_editable = True
+        controller.transform.set_rotation(15)
+        controller.image_width, controller.image_height = width, height
+        # Camera frames come in larger than the processing size and have to be resized
+        run_frame = frame_loop(
+            controller,
+            synthetic_frame(width * 2, height * 2),
+            hands_xyz,
+            ["Left", "Right"],
+        )
+        for _ in range(warmup):
+            run_frame()
+        allocations = controller.frame_pool.allocations
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        for _ in range(frames):
+            run_frame()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results["controller.frame@{}x{}".format(width, height)] = {
+            "pool_allocations_per_frame": (
+                controller.frame_pool.allocations - allocations
+            )
+            / frames,
+            "peak_transient_kb": (peak - baseline) / 1024,
+            "frame_kb": width * height * 3 / 1024,
+        }
+    return results
+
+
+def run(resolutions, iterations, warmup, pattern=None):
+    """Method for running every benchmark
+
+    Args:
+        resolutions (List of (int, int)): Frame sizes of the image and controller benchmarks
+        iterations (int): Timed iterations per benchmark
+        warmup (int): Untimed iterations per benchmark
+        pattern (str): Only run benchmarks whose name contains it
+
+    Returns:
+        dict: Results keyed by benchmark name
+    """
+    suites = [gesture_benchmarks()]
+    for width, height in resolutions:
+        suites += [
+            image_benchmarks(width, height),
+            controller_benchmarks(width, height),
+        ]
+    results = {}
+    for suite in suites:
+        for name, fn in suite:
+            if pattern and pattern not in name:
+                continue
+            results[name] = timeit(fn, iterations, warmup)
+            print_result(name, results[name])
+    if not pattern or pattern in "controller.frame memory":
+        for name, allocations in allocation_benchmarks(resolutions).items():
+            print(
+                "{:<52} {:>10.2f} pool allocations/frame, peak transient {:.0f} KB (frame {:.0f} KB)".format(
+                    name + " memory",
+                    allocations["pool_allocations_per_frame"],
+                    allocations["peak_transient_kb"],
+                    allocations["frame_kb"],
+                )
+            )
+    return results
+
+
+def print_result(name, result):
+    print(
+        "{:<52} {:>10.0f}/s  p50 {:>8.3f} ms  p95 {:>8.3f} ms  p99 {:>8.3f} ms".format(
+            name,
+            result["ops_per_s"],
+            result["p50_ms"],
+            result["p95_ms"],
+            result["p99_ms"],
+        )
+    )
+
+
+def compare(results, baseline, threshold):
+    """Method for finding the benchmarks whose median latency regressed against a baseline
+
+    Args:
+        results (dict): Results of run
+        baseline (dict): Results loaded from a saved baseline
+        threshold (float): Allowed relative slowdown, 0.25 allows 25%
+
+    Returns:
+        List of str: Description of each regression
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["p50_ms"], result["p50_ms"]
+        if before > 0 and after > before * (1 + threshold):
+            regressions.append(
+                "{}: p50 {:.3f} ms -> {:.3f} ms (+{:.0%})".format(
+                    name, before, after, after / before - 1
+                )
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the per frame hot paths")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument(
+        "--resolutions",
+        default=",".join("{}x{}".format(*size) for size in RESOLUTIONS),
+        help="Comma separated WIDTHxHEIGHT list",
+    )
+    parser.add_argument("--filter", default=None, help="Only run matching benchmarks")
+    parser.add_argument("--save", default=None, help="Write results to this JSON file")
+    parser.add_argument(
+        "--compare", default=None, help="Baseline JSON file to check for regressions"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed relative slowdown of the median latency",
+    )
+    args = parser.parse_args()
+
+    save_path = os.path.abspath(args.save) if args.save else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    resolutions = [
+        tuple(int(value) for value in size.split("x"))
+        for size in args.resolutions.split(",")
+    ]
+    results = run(resolutions, args.iterations, args.warmup, args.filter)
+    if save_path:
+        with open(save_path, "w") as baseline_file:
+            json.dump(
+                {
+                    "machine": platform.platform(),
+                    "python": platform.python_version(),
+                    "results": results,
+                },
+                baseline_file,
+                indent=2,
+            )
+    if compare_path:
+        with open(compare_path) as baseline_file:
+            regressions = compare(
+                results, json.load(baseline_file)["results"], args.threshold
+            )
+        if regressions:
+            print("Regressions beyond {:.0%}:".format(args.threshold))
+            print("\n".join(regressions))
+            sys.exit(1)
+        print("No regression beyond {:.0%}".format(args.threshold))
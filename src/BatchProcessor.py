@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+from HandController import HandController
+from LandmarkRecording import LandmarkRecorder, pad_hands
+
+VIDEO_EXTENSIONS = (".avi", ".mp4", ".mov", ".mkv", ".webm", ".m4v")
+
+# Keyword arguments of the Hands created for each video, set by _init_worker
+_hands_kwargs = dict(min_detection_confidence=0.7, min_tracking_confidence=0.7)
+
+
+def collect_videos(inputs, extensions=VIDEO_EXTENSIONS):
+    """Method for expanding a list of video files and directories into video files
+
+    Args:
+        inputs (List of str): Video files or directories, directories are searched recursively
+        extensions (tuple of str): Extensions of the files picked from directories
+
+    Returns:
+        List of str: Video file paths
+    """
+    videos = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos += [
+                    os.path.join(root, name)
+                    for name in sorted(files)
+                    if name.lower().endswith(extensions)
+                ]
+        else:
+            videos.append(path)
+    return videos
+
+
+def output_stems(videos):
+    """Method for naming the outputs of each video, unique even when videos found in different
+    directories share a file name
+
+    Args:
+        videos (List of str): Video files
+
+    Returns:
+        List of str: Output file name without extension of each video, its path relative to the deepest
+            directory holding every video with the separators replaced by "__"
+    """
+    if not videos:
+        return []
+    paths = [os.path.abspath(video) for video in videos]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+    stems = [
+        os.path.splitext(os.path.relpath(path, root))[0].replace(os.sep, "__")
+        for path in paths
+    ]
+    # Same path given twice or names differing only by their extension
+    seen = {}
+    for index, stem in enumerate(stems):
+        count = seen.get(stem, 0)
+        seen[stem] = count + 1
+        if count:
+            stems[index] = "{}_{}".format(stem, count + 1)
+    return stems
+
+
+def _init_worker(hands_kwargs):
+    global _hands_kwargs
+    # Imported once per worker rather than with its first video
+    import mediapipe  # noqa: F401
+
+    _hands_kwargs = hands_kwargs
+
+
+def _frame_record(frame_index, timestamp, hands_xyz, labels, gestures, registry):
+    return {
+        "frame": frame_index,
+        "time": round(timestamp, 4),
+        "hands": [
+            {
+                "label": label,
+                "gesture": registry.gesture(gesture).name,
+                "landmarks": np.round(hand_xyz.astype(np.float64), 5).tolist(),
+            }
+            for hand_xyz, label, gesture in zip(hands_xyz, labels, gestures)
+        ],
+    }
+
+
+def process_video(path, output_dir, timeline_format="jsonl", render=False, stem=None):
+    """Method for running hand tracking and the gesture logic over a whole video without a display. Runs in
+    a worker process with a Hands instance of its own, as MediaPipe tracking state belongs to one video.
+
+    Args:
+        path (str): Video file
+        output_dir (str): Directory receiving the timeline and the optional rendered video
+        timeline_format (str): "jsonl" for one JSON object per frame, "npz" for a NumPy archive or
+            "landmarks" for a LandmarkRecorder file that can be replayed
+        render (bool): Also write the webcam frame and control panel video like the live application
+        stem (str): Output file name without extension, defaults to the video file name, see output_stems
+
+    Raises:
+        ValueError: If the video cannot be opened
+
+    Returns:
+        dict: Summary with the path, number of frames, processing time and frames per second
+    """
+    import mediapipe as mp
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError("Cannot open video {}".format(path))
+    controller = HandController()
+    gesture_utils = controller.gesture_utils
+    hands = mp.solutions.hands.Hands(**_hands_kwargs)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    if stem is None:
+        stem = os.path.splitext(os.path.basename(path))[0]
+    timeline = recorder = None
+    if timeline_format == "jsonl":
+        timeline = open(os.path.join(output_dir, stem + ".jsonl"), "w")
+    elif timeline_format == "landmarks":
+        recorder = LandmarkRecorder(
+            os.path.join(output_dir, stem + ".vclm"),
+            controller.image_width,
+            controller.image_height,
+        )
+    padded_frames = []
+    out = None
+    start = time.perf_counter()
+    frame_index = 0
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            image = controller.preprocess(frame)
+            hands_xyz, labels = controller.infer(hands, image)
+            gestures = gesture_utils.classify_batch(hands_xyz)
+            timestamp = frame_index / fps
+            if timeline is not None:
+                record = _frame_record(
+                    frame_index,
+                    timestamp,
+                    hands_xyz,
+                    labels,
+                    gestures,
+                    gesture_utils.registry,
+                )
+                timeline.write(json.dumps(record) + "\n")
+            elif recorder is not None:
+                recorder.write(hands_xyz, labels, timestamp)
+            else:
+                padded_frames.append(pad_hands(hands_xyz, labels, gestures))
+            if render:
+                composite = controller.render_landmarks(image, hands_xyz, labels)
+                if out is None:
+                    out = cv2.VideoWriter(
+                        os.path.join(output_dir, stem + "_output.avi"),
+                        cv2.VideoWriter_fourcc(*"XVID"),
+                        fps,
+                        composite.shape[1::-1],
+                    )
+                out.write(composite)
+                controller.release_composite(composite)
+            controller.release_frame(image)
+            frame_index += 1
+    finally:
+        hands.close()
+        cap.release()
+        if out is not None:
+            out.release()
+        if timeline is not None:
+            timeline.close()
+        if recorder is not None:
+            recorder.close()
+    elapsed = time.perf_counter() - start
+
+    if timeline_format == "npz":
+        if not padded_frames:
+            padded_frames = [pad_hands(np.empty((0, 21, 3)), [], [])]
+            frames_to_keep = 0
+        else:
+            frames_to_keep = len(padded_frames)
+        landmarks, handedness, gestures = (
+            np.stack(arrays)[:frames_to_keep] for arrays in zip(*padded_frames)
+        )
+        np.savez_compressed(
+            os.path.join(output_dir, stem + ".npz"),
+            timestamps=np.arange(frame_index) / fps,
+            landmarks=landmarks,
+            handedness=handedness,
+            gestures=gestures,
+            fps=fps,
+        )
+    return {
+        "path": path,
+        "frames": frame_index,
+        "seconds": elapsed,
+        "fps": frame_index / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def run_batch(
+    videos,
+    output_dir,
+    workers=None,
+    timeline_format="jsonl",
+    render=False,
+    hands_kwargs=None,
+):
+    """Method for processing many videos in parallel, one Hands instance per video
+
+    Args:
+        videos (List of str): Video files
+        output_dir (str): Directory receiving the outputs
+        workers (int): Number of worker processes, defaults to the number of cores
+        timeline_format (str): "jsonl", "npz" or "landmarks"
+        render (bool): Also write the rendered output videos
+        hands_kwargs (dict): Keyword arguments of mediapipe Hands
+
+    Returns:
+        List of dict: Summary of each video, see process_video
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if hands_kwargs is None:
+        hands_kwargs = dict(min_detection_confidence=0.7, min_tracking_confidence=0.7)
+    summaries = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(hands_kwargs,)
+    ) as executor:
+        futures = {
+            executor.submit(
+                process_video, video, output_dir, timeline_format, render, stem
+            ): video
+            for video, stem in zip(videos, output_stems(videos))
+        }
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as error:
+                print("Failed to process {}: {}".format(futures[future], error))
+                continue
+            summaries.append(summary)
+            print(
+                "{path}: {frames} frames in {seconds:.1f} s ({fps:.1f} fps)".format(
+                    **summary
+                )
+            )
+    elapsed = time.perf_counter() - start
+    total_frames = sum(summary["frames"] for summary in summaries)
+    print(
+        "Processed {} of {} videos, {} frames in {:.1f} s: {:.1f} fps overall".format(
+            len(summaries),
+            len(videos),
+            total_frames,
+            elapsed,
+            total_frames / elapsed if elapsed > 0 else 0.0,
+        )
+    )
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run hand tracking and gesture detection over recorded videos without a display"
+    )
+    parser.add_argument("inputs", nargs="+", help="Video files or directories")
+    parser.add_argument("--output-dir", default="batch_output")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Defaults to the number of cores"
+    )
+    parser.add_argument(
+        "--format", choices=("jsonl", "npz", "landmarks"), default="jsonl"
+    )
+    parser.add_argument(
+        "--render", action="store_true", help="Also write the rendered output video"
+    )
+    args = parser.parse_args()
+    run_batch(
+        collect_videos(args.inputs),
+        args.output_dir,
+        workers=args.workers,
+        timeline_format=args.format,
+        render=args.render,
+    )
@@ -0,0 +1,202 @@
+import cv2
+import numpy as np
+
+
+class Stroke:
+    """One continuous line drawn on the canvas"""
+
+    __slots__ = ("stroke_id", "points", "bbox")
+
+    def __init__(self, stroke_id):
+        self.stroke_id = stroke_id
+        self.points = []
+        self.bbox = None
+
+    def __len__(self):
+        return len(self.points)
+
+
+class DrawingCanvas:
+    """Persistent drawing layer for the hand drawing feature.
+
+    Every new point only rasterises the segment joining it to the previous point of the stroke, so the cost
+    per frame does not depend on how much was drawn before. Each pixel remembers the stroke that painted it
+    first, which lets undo erase the last stroke by touching only its bounding box. Stroke history is kept
+    simplified and capped at max_points, older strokes (and the head of overly long strokes) are baked into the
+    layer and can no longer be undone.
+    """
+
+    def __init__(
+        self,
+        color=(0, 0, 255),
+        thickness=10,
+        alpha=1.0,
+        min_distance=2.0,
+        epsilon=1.0,
+        max_points=4096,
+    ):
+        """
+        Args:
+            color ((B, G, R)): Color of the strokes
+            thickness (int): Line thickness in pixels
+            alpha (float): Opacity of the drawing when blended on the frame
+            min_distance (float): Points closer than this to the previous point of the stroke are ignored
+            epsilon (float): Tolerance in pixels of the polyline simplification applied to finished strokes
+            max_points (int): Maximum number of points kept in the undo history
+        """
+        self.color = np.array(color, dtype=np.uint8)
+        self.thickness = thickness
+        self.alpha = alpha
+        self.min_distance = min_distance
+        self.epsilon = epsilon
+        self.max_points = max_points
+        self.strokes = []
+        self.num_points = 0
+        self.current = None
+        self.owner = None
+        self.mask = None
+        self.layer = None
+        self._blended = None
+        self.is_empty = True
+        self._next_id = 1
+
+    @property
+    def shape(self):
+        return None if self.mask is None else self.mask.shape
+
+    def ensure_size(self, width, height):
+        """Method for allocating the layer, or clearing and reallocating it if the frame size changed"""
+        if self.shape != (height, width):
+            self.owner = np.zeros((height, width), np.int32)
+            self.mask = np.zeros((height, width), np.uint8)
+            self.layer = np.empty((height, width, 3), np.uint8)
+            self.layer[:] = self.color
+            self._blended = np.empty_like(self.layer)
+            self.strokes = []
+            self.num_points = 0
+            self.current = None
+            self.is_empty = True
+
+    def add_point(self, x, y):
+        """Method for extending the current stroke, starting a new one if needed
+
+        Args:
+            x (int): X position in pixels
+            y (int): Y position in pixels
+        """
+        if self.current is None:
+            self.current = Stroke(self._next_id)
+            self._next_id += 1
+            self.strokes.append(self.current)
+            self._rasterize(self.current, (x, y), (x, y))
+        else:
+            last_x, last_y = self.current.points[-1]
+            if np.hypot(x - last_x, y - last_y) < self.min_distance:
+                return
+            self._rasterize(self.current, (last_x, last_y), (x, y))
+        self.current.points.append((x, y))
+        self.num_points += 1
+        self.is_empty = False
+        self._bake_old_strokes()
+
+    def end_stroke(self):
+        """Method for finishing the current stroke, its points are simplified and stored compactly"""
+        stroke, self.current = self.current, None
+        if stroke is None:
+            return
+        points = np.array(stroke.points, dtype=np.int32).reshape(-1, 1, 2)
+        if len(points) > 2:
+            points = cv2.approxPolyDP(points, self.epsilon, False)
+        self.num_points += len(points) - len(stroke.points)
+        stroke.points = points.reshape(-1, 2).astype(np.int16)
+
+    def undo(self):
+        """Method for erasing the most recent stroke still in the undo history
+
+        Returns:
+            boolean: True if a stroke was erased
+        """
+        self.end_stroke()
+        if not self.strokes:
+            return False
+        stroke = self.strokes.pop()
+        self.num_points -= len(stroke)
+        if stroke.bbox is None:
+            return True
+        x0, y0, x1, y1 = stroke.bbox
+        owner = self.owner[y0:y1, x0:x1]
+        painted = owner == stroke.stroke_id
+        owner[painted] = 0
+        self.mask[y0:y1, x0:x1][painted] = 0
+        if not self.strokes:
+            self.is_empty = not self.mask.any()
+        return True
+
+    def clear(self):
+        """Method for erasing the whole drawing and its history"""
+        self.current = None
+        self.strokes = []
+        self.num_points = 0
+        if self.mask is not None:
+            self.owner.fill(0)
+            self.mask.fill(0)
+        self.is_empty = True
+
+    def blend(self, image):
+        """Method for drawing the layer on top of a frame in place
+
+        Args:
+            image (BGR): Frame of the same size as the canvas
+
+        Returns:
+            BGR Image: image
+        """
+        if self.is_empty or self.mask is None:
+            return image
+        if self.alpha >= 1.0:
+            return cv2.copyTo(self.layer, self.mask, image)
+        cv2.addWeighted(
+            image, 1.0 - self.alpha, self.layer, self.alpha, 0.0, dst=self._blended
+        )
+        return cv2.copyTo(self._blended, self.mask, image)
+
+    def _rasterize(self, stroke, start_xy, end_xy):
+        height, width = self.mask.shape
+        pad = self.thickness // 2 + 1
+        x0 = max(min(start_xy[0], end_xy[0]) - pad, 0)
+        y0 = max(min(start_xy[1], end_xy[1]) - pad, 0)
+        x1 = min(max(start_xy[0], end_xy[0]) + pad + 1, width)
+        y1 = min(max(start_xy[1], end_xy[1]) + pad + 1, height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        segment = np.zeros((y1 - y0, x1 - x0), np.uint8)
+        cv2.line(
+            segment,
+            (start_xy[0] - x0, start_xy[1] - y0),
+            (end_xy[0] - x0, end_xy[1] - y0),
+            255,
+            self.thickness,
+        )
+        owner = self.owner[y0:y1, x0:x1]
+        new_pixels = (segment > 0) & (owner == 0)
+        owner[new_pixels] = stroke.stroke_id
+        self.mask[y0:y1, x0:x1][new_pixels] = 255
+        if stroke.bbox is None:
+            stroke.bbox = [x0, y0, x1, y1]
+        else:
+            bbox = stroke.bbox
+            bbox[0], bbox[1] = min(bbox[0], x0), min(bbox[1], y0)
+            bbox[2], bbox[3] = max(bbox[2], x1), max(bbox[3], y1)
+
+    def _bake_old_strokes(self):
+        if self.num_points > self.max_points and self.strokes == [self.current]:
+            # A single stroke longer than the cap is split so that its head can be baked
+            last_xy = self.current.points[-1]
+            self.end_stroke()
+            self.current = Stroke(self._next_id)
+            self._next_id += 1
+            self.current.points.append(last_xy)
+            self.strokes.append(self.current)
+            self.num_points += 1
+        while self.num_points > self.max_points and len(self.strokes) > 1:
+            self.num_points -= len(self.strokes.pop(0))
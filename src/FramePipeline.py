@@ -0,0 +1,286 @@
+import threading
+import time
+from collections import deque
+from queue import Empty, Full
+
+
+class FrameQueue:
+    """Bounded, thread safe queue between two pipeline stages with a configurable drop policy.
+    Supported policies are
+    1. drop_oldest: discard the stalest queued item so that the consumer always gets the newest frame
+    2. drop_newest: discard the incoming item and keep what is already queued
+    3. block: wait for the consumer to make room
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(self, maxsize=1, policy="drop_oldest", on_drop=None):
+        """
+        Args:
+            maxsize (int): Capacity
+            policy (str): Drop policy, see POLICIES
+            on_drop (callable): Called with every dropped item, e.g. to give its buffers back to a FramePool
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if policy not in self.POLICIES:
+            raise ValueError(
+                "Unknown drop policy {}, expected one of {}".format(
+                    policy, self.POLICIES
+                )
+            )
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self.on_drop = on_drop
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item, timeout=None):
+        """Method for adding an item, applying the drop policy when the queue is full
+
+        Args:
+            item (object): Item to be queued
+            timeout (float): Seconds to wait for room when policy is block, None waits forever
+
+        Returns:
+            boolean: True if the item was queued, False if it was dropped
+        """
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                if self.policy == "drop_oldest":
+                    self._drop(self._items.popleft())
+                elif self.policy == "drop_newest":
+                    self._drop(item)
+                    return False
+                else:
+                    if not self._cond.wait_for(
+                        lambda: self.closed or len(self._items) < self.maxsize,
+                        timeout,
+                    ):
+                        raise Full
+                    if self.closed:
+                        return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def _drop(self, item):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    def get(self, timeout=None):
+        """Method for taking the oldest queued item
+
+        Args:
+            timeout (float): Seconds to wait for an item, None waits forever
+
+        Raises:
+            Empty: If no item arrived in time or the queue was closed and drained
+
+        Returns:
+            object: Queued item
+        """
+        with self._cond:
+            if (
+                not self._cond.wait_for(lambda: self.closed or self._items, timeout)
+                or not self._items
+            ):
+                raise Empty
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Method for waking up every waiting producer and consumer so that they can exit"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """Throughput counters of a single pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy_time = 0.0
+        self.started_at = time.perf_counter()
+
+    def add(self, seconds):
+        self.frames += 1
+        self.busy_time += seconds
+
+    def fps(self):
+        elapsed = time.perf_counter() - self.started_at
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def utilization(self):
+        elapsed = time.perf_counter() - self.started_at
+        return self.busy_time / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        avg_ms = 1000.0 * self.busy_time / self.frames if self.frames else 0.0
+        return "{}: {:.1f} fps, {:.2f} ms/frame, {:.0f}% busy".format(
+            self.name, self.fps(), avg_ms, 100.0 * self.utilization()
+        )
+
+
+class FramePipeline:
+    """Runs a frame source, a chain of processing stages and a sink concurrently, joined by bounded
+    FrameQueues. The source and every stage run on their own thread, the sink runs on the calling thread
+    so that it can own the GUI (cv2.imshow only works reliably from the main thread).
+
+    Any callable may return None to drop the current frame. The source returning None is treated as a
+    missed frame and raising StopIteration drains the frames in flight before the pipeline ends. The sink
+    returning False stops every stage immediately. An exception raised by the source or a stage stops the
+    pipeline and is raised again by run on the calling thread.
+    """
+
+    def __init__(self, source, stages, sink, queue_size=1, policy="drop_oldest"):
+        """
+        Args:
+            source (callable): Called repeatedly with no argument to produce frames
+            stages (List of (name, callable)): Processing stages applied in order
+            sink ((name, callable)): Final stage run on the calling thread
+            queue_size (int): Capacity of every queue between stages
+            policy (str): Drop policy of every queue, see FrameQueue
+        """
+        self.source = source
+        self.stages = list(stages)
+        self.sink = sink
+        self.queues = [
+            FrameQueue(queue_size, policy) for _ in range(len(self.stages) + 1)
+        ]
+        self.stats = [StageStats("capture")]
+        self.stats += [StageStats(name) for name, _ in self.stages]
+        self.stats.append(StageStats(sink[0]))
+        self._stop = threading.Event()
+        self._threads = []
+        self._error = None
+
+    def _fail(self, error):
+        # Keeps the first error, the ones it causes in other stages are not interesting
+        if self._error is None:
+            self._error = error
+        self.stop()
+
+    def _run_source(self):
+        stats, out_queue = self.stats[0], self.queues[0]
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = self.source()
+                except StopIteration:
+                    break
+                if item is None:
+                    continue
+                stats.add(time.perf_counter() - start)
+                out_queue.put(item)
+        except Exception as error:
+            self._fail(error)
+        finally:
+            out_queue.close()
+
+    def _run_stage(self, index):
+        _, fn = self.stages[index]
+        stats = self.stats[index + 1]
+        in_queue, out_queue = self.queues[index], self.queues[index + 1]
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = in_queue.get(timeout=0.1)
+                except Empty:
+                    if in_queue.closed:
+                        break
+                    continue
+                start = time.perf_counter()
+                item = fn(item)
+                stats.add(time.perf_counter() - start)
+                if item is not None:
+                    out_queue.put(item)
+        except Exception as error:
+            self._fail(error)
+        finally:
+            out_queue.close()
+
+    def run(self, report_interval=5.0):
+        """Method for running the pipeline until the source is exhausted or the sink asks to stop. Returns
+        once every thread has exited, so the resources used by the stages can be released afterwards.
+
+        Args:
+            report_interval (float): Seconds between throughput reports, None disables periodic reports
+
+        Raises:
+            Exception: The first exception raised by the source or a stage
+        """
+        self._stop.clear()
+        self._error = None
+        self._threads = [threading.Thread(target=self._run_source, daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._run_stage, args=(idx,), daemon=True)
+            for idx in range(len(self.stages))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        _, sink_fn = self.sink
+        sink_stats, in_queue = self.stats[-1], self.queues[-1]
+        last_report = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = in_queue.get(timeout=0.1)
+                except Empty:
+                    if in_queue.closed:
+                        break
+                    continue
+                start = time.perf_counter()
+                keep_running = sink_fn(item)
+                sink_stats.add(time.perf_counter() - start)
+                if keep_running is False:
+                    break
+                if (
+                    report_interval is not None
+                    and time.perf_counter() - last_report >= report_interval
+                ):
+                    print(self.report())
+                    last_report = time.perf_counter()
+        finally:
+            self.stop()
+            # Every loop checks the stop flag between frames, so this waits for at most one frame per stage
+            for thread in self._threads:
+                thread.join()
+        print(self.report())
+        if self._error is not None:
+            raise self._error
+
+    def stop(self):
+        self._stop.set()
+        for frame_queue in self.queues:
+            frame_queue.close()
+
+    def report(self):
+        """Method for summarising throughput of every stage and frames dropped between stages
+
+        Returns:
+            str: Human readable report
+        """
+        lines = [str(stats) for stats in self.stats]
+        dropped = ", ".join(
+            "{}->{}: {}".format(
+                self.stats[idx].name, self.stats[idx + 1].name, frame_queue.dropped
+            )
+            for idx, frame_queue in enumerate(self.queues)
+        )
+        lines.append("dropped frames " + dropped)
+        return "\n".join(lines)
@@ -0,0 +1,97 @@
+import threading
+
+import numpy as np
+
+
+class FramePool:
+    """Named image buffers reused from frame to frame, to be filled through the dst= argument of OpenCV
+    calls instead of allocating new arrays.
+
+    Two kinds of buffers are handed out:
+    1. get: scratch buffers only used within one call. Each name owns a ring of depth buffers handed out in
+       turn, so a buffer is overwritten depth calls later
+    2. acquire: frames that outlive the call, e.g. handed between threads, queued or displayed. They are only
+       reused once given back with release, so a frame is never overwritten while a stage still uses it
+       whatever the timing of the threads. A frame that is never released is simply garbage collected
+    """
+
+    def __init__(self, depth=1):
+        """
+        Args:
+            depth (int): Scratch buffers per name
+        """
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.depth = depth
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self._rings = {}
+        self._free = {}
+        self._lock = threading.Lock()
+
+    def _allocate(self, shape, dtype):
+        buffer = np.empty(shape, dtype)
+        self.allocations += 1
+        self.allocated_bytes += buffer.nbytes
+        return buffer
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Method for getting the next scratch buffer of a name, allocated on first use or when the shape
+        changed
+
+        Args:
+            name (str): Buffer name, e.g. "resized" or "rgb"
+            shape (tuple of int): Required shape
+            dtype (np.dtype): Required data type
+
+        Returns:
+            np.ndarray: Buffer with undefined content
+        """
+        ring = self._rings.get(name)
+        if ring is None:
+            ring = self._rings[name] = [[None] * self.depth, 0]
+        buffers, index = ring
+        ring[1] = (index + 1) % self.depth
+        buffer = buffers[index]
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = buffers[index] = self._allocate(shape, dtype)
+        return buffer
+
+    def acquire(self, name, shape, dtype=np.uint8):
+        """Method for taking a frame buffer of a name out of the pool until it is released, allocated when
+        no released buffer fits. Thread safe.
+
+        Args:
+            name (str): Buffer name, e.g. "frame" or "composite"
+            shape (tuple of int): Required shape
+            dtype (np.dtype): Required data type
+
+        Returns:
+            np.ndarray: Buffer with undefined content
+        """
+        shape = tuple(shape)
+        with self._lock:
+            free = self._free.get(name)
+            while free:
+                buffer = free.pop()
+                if buffer.shape == shape and buffer.dtype == dtype:
+                    return buffer
+            return self._allocate(shape, dtype)
+
+    def release(self, name, buffer):
+        """Method for giving back a buffer returned by acquire once nothing uses it anymore. Thread safe.
+
+        Args:
+            name (str): Name the buffer was acquired with
+            buffer (np.ndarray): Buffer, ignored when None
+        """
+        if buffer is None:
+            return
+        with self._lock:
+            self._free.setdefault(name, []).append(buffer)
+
+    def clear(self):
+        """Method for releasing every buffer"""
+        with self._lock:
+            self._rings.clear()
+            self._free.clear()
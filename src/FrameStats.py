@@ -0,0 +1,206 @@
+import json
+import time
+
+import cv2
+import numpy as np
+
+
+class StageHistogram:
+    """Rolling window of the latest latency samples of one stage"""
+
+    def __init__(self, window):
+        self.samples = np.zeros(window)
+        self.count = 0
+
+    def add(self, milliseconds):
+        self.samples[self.count % len(self.samples)] = milliseconds
+        self.count += 1
+
+    def summary(self):
+        """Method for summarising the window
+
+        Returns:
+            dict: Total number of samples and mean/p50/p95/p99 of the window in milliseconds
+        """
+        window = self.samples[: min(self.count, len(self.samples))]
+        if not len(window):
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(window, (50, 95, 99))
+        return {
+            "count": self.count,
+            "mean_ms": float(window.mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+        }
+
+
+class _StageTimer:
+    """Context manager timing one stage, reused across frames to avoid allocations"""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.add(1000.0 * (time.perf_counter() - self.start))
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class FrameStats:
+    """Per stage latency instrumentation of the capture loop.
+
+    Stages are timed with `with frame_stats.stage("capture"):` and kept in rolling windows so that
+    p50/p95/p99 reflect the recent frames. The timer of a stage is reused, so a stage name must only be
+    timed by one thread at a time (true for the serial loop and for each stage of the pipelined mode).
+    When disabled every call returns immediately and stage() hands out a shared no-op timer.
+    """
+
+    def __init__(self, enabled=True, window=512, dump_path=None, dump_interval=10.0):
+        """
+        Args:
+            enabled (bool): Record anything at all
+            window (int): Number of latest samples kept per stage
+            dump_path (str): JSON lines file receiving a snapshot every dump_interval seconds
+            dump_interval (float): Seconds between snapshots written to dump_path
+        """
+        self.enabled = enabled
+        self.window = window
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.histograms = {}
+        self.drops = {}
+        self.frames = 0
+        self._timers = {}
+        self._frame_times = StageHistogram(window)
+        self._last_frame_at = None
+        self._last_dump_at = time.monotonic()
+
+    def stage(self, name):
+        """Method for timing a stage
+
+        Args:
+            name (str): Stage name
+
+        Returns:
+            Context manager recording the time spent in its block
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        timer = self._timers.get(name)
+        if timer is None:
+            histogram = self.histograms[name] = StageHistogram(self.window)
+            timer = self._timers[name] = _StageTimer(histogram)
+        return timer
+
+    def drop(self, reason, count=1):
+        """Method for counting dropped frames
+
+        Args:
+            reason (str): Where the frame was dropped, e.g. "capture" for failed camera reads
+            count (int): Number of frames dropped
+        """
+        if self.enabled:
+            self.drops[reason] = self.drops.get(reason, 0) + count
+
+    def set_drops(self, reason, total):
+        """Method for reporting a drop count maintained elsewhere, e.g. FrameQueue.dropped
+
+        Args:
+            reason (str): Where the frames were dropped
+            total (int): Frames dropped so far
+        """
+        if self.enabled:
+            self.drops[reason] = total
+
+    def frame_done(self):
+        """Method to call once per displayed frame, measures the frame rate and writes periodic dumps"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._last_frame_at is not None:
+            self._frame_times.add(1000.0 * (now - self._last_frame_at))
+        self._last_frame_at = now
+        self.frames += 1
+        if (
+            self.dump_path
+            and time.monotonic() - self._last_dump_at >= self.dump_interval
+        ):
+            self.dump(self.dump_path)
+
+    def snapshot(self):
+        """Method for getting the current statistics
+
+        Returns:
+            dict: Time, frame count, rolling fps, frame time, dropped frames and latency of each stage
+        """
+        frame_time = self._frame_times.summary()
+        mean_ms = frame_time.get("mean_ms", 0.0)
+        return {
+            "time": time.time(),
+            "frames": self.frames,
+            "fps": 1000.0 / mean_ms if mean_ms > 0 else 0.0,
+            "frame_time": frame_time,
+            "drops": dict(self.drops),
+            "stages": {
+                name: histogram.summary()
+                for name, histogram in list(self.histograms.items())
+            },
+        }
+
+    def dump(self, path):
+        """Method for appending a snapshot to a JSON lines file"""
+        self._last_dump_at = time.monotonic()
+        with open(path, "a") as dump_file:
+            dump_file.write(json.dumps(self.snapshot()) + "\n")
+
+    def draw_overlay(self, image, origin=(10, 90)):
+        """Method for writing the statistics on an image in place
+
+        Args:
+            image (BGR): Image receiving the text, typically the control panel
+            origin ((int, int)): Position of the first line
+        """
+        if not self.enabled:
+            return
+        snapshot = self.snapshot()
+        lines = [
+            "{:.1f} fps, dropped {}".format(
+                snapshot["fps"], sum(snapshot["drops"].values())
+            ),
+            "stage        p50    p95    p99 ms",
+        ]
+        for name, summary in snapshot["stages"].items():
+            if summary["count"]:
+                lines.append(
+                    "{:<10} {:>6.2f} {:>6.2f} {:>6.2f}".format(
+                        name[:10],
+                        summary["p50_ms"],
+                        summary["p95_ms"],
+                        summary["p99_ms"],
+                    )
+                )
+        x, y = origin
+        for line in lines:
+            cv2.putText(
+                image, line, (x, y), cv2.FONT_HERSHEY_PLAIN, 1.0, (0, 255, 0), 1
+            )
+            y += 16
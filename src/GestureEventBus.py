@@ -0,0 +1,296 @@
+"""Publishes the gestures detected by HandController to other local processes.
+
+Events are fixed size binary datagrams (see EVENT) carrying a sequence number and a time.monotonic()
+timestamp, which is shared by every process of the machine. They are sent over Unix domain datagram sockets,
+one per subscriber in a directory only the user can access, or over UDP on localhost where Unix sockets are
+not available.
+Sends never block: when a subscriber's socket buffer is full the event is dropped for that subscriber and
+counted, so a slow consumer cannot stall the capture loop.
+
+Running this module prints the events of a running HandController:
+
+    python src/HandController.py --events
+    python src/GestureEventBus.py
+"""
+
+import argparse
+import getpass
+import os
+import select
+import socket
+import stat
+import struct
+import tempfile
+import time
+from collections import namedtuple
+from enum import IntEnum
+
+# type, hand, gesture, sequence number, timestamp, three values whose meaning depends on the type
+EVENT = struct.Struct("<BBHId3f")
+DEFAULT_UDP_PORT = 47800
+# Seconds between scans of the socket directory for new subscribers
+SUBSCRIBER_SCAN_INTERVAL = 1.0
+
+HAND_LEFT = 0
+HAND_RIGHT = 1
+
+
+class EventType(IntEnum):
+    # the gesture of a hand changed, values unused
+    GESTURE = 1
+    # left hand closed state changed, value 0 is 1.0 when editing is enabled
+    EDITABLE = 2
+    # values: zoom change, resulting zoom level, scale factor
+    ZOOM = 3
+    # values: resulting angle in degrees
+    ROTATE = 4
+    # values: normalized x and y of the drawn point
+    DRAW = 5
+
+
+GestureEvent = namedtuple(
+    "GestureEvent", ["type", "hand", "gesture", "seq", "timestamp", "values"]
+)
+
+
+def unix_sockets_available():
+    return hasattr(socket, "AF_UNIX")
+
+
+def default_directory():
+    """Method for choosing the socket directory of the current user: under $XDG_RUNTIME_DIR, which only the
+    user can access, or a directory of its own in the temporary directory
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "visualcontroller-events")
+    return os.path.join(
+        tempfile.gettempdir(), "visualcontroller-events-{}".format(getpass.getuser())
+    )
+
+
+DEFAULT_DIRECTORY = default_directory()
+
+
+def private_directory(directory):
+    """Method for creating the socket directory with access for the current user only, or checking that an
+    existing one is, so that other users can neither read the events nor plant sockets
+
+    Args:
+        directory (str): Socket directory
+
+    Raises:
+        PermissionError: If the directory is a symbolic link, belongs to another user or others can access it
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return
+    info = os.lstat(directory)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise PermissionError(
+            "{} must be a directory of the current user that others cannot access".format(
+                directory
+            )
+        )
+
+
+def decode_event(data):
+    """Method for decoding a datagram
+
+    Returns:
+        GestureEvent: Event, values is a tuple of three floats
+    """
+    event_type, hand, gesture, seq, timestamp, a, b, c = EVENT.unpack(data)
+    return GestureEvent(EventType(event_type), hand, gesture, seq, timestamp, (a, b, c))
+
+
+class GestureEventPublisher:
+    """Sends events to every subscriber without ever blocking. Over UDP the kernel drops datagrams for a slow
+    subscriber silently, they only show up as lost sequence numbers on the subscriber side.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, udp_port=None):
+        """
+        Args:
+            directory (str): Directory holding one socket per subscriber, created when missing
+            udp_port (int): Send to this localhost UDP port instead, the default when Unix sockets are not
+                available
+
+        Raises:
+            PermissionError: If other users can access directory, see private_directory
+        """
+        self.directory = directory
+        if udp_port is None and not unix_sockets_available():
+            udp_port = DEFAULT_UDP_PORT
+        self.udp_port = udp_port
+        self.seq = 0
+        self.sent = 0
+        self.dropped = 0
+        self._buffer = bytearray(EVENT.size)
+        self._subscribers = ()
+        self._scanned_at = 0.0
+        if udp_port is None:
+            private_directory(directory)
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._subscribers = (("127.0.0.1", udp_port),)
+        self._socket.setblocking(False)
+
+    def _scan(self, now):
+        self._scanned_at = now
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            names = []
+        self._subscribers = tuple(
+            os.path.join(self.directory, name)
+            for name in names
+            if name.endswith(".sock")
+        )
+
+    def publish(self, event_type, hand=HAND_RIGHT, gesture=0, a=0.0, b=0.0, c=0.0):
+        """Method for sending one event to every subscriber
+
+        Args:
+            event_type (EventType): Event type
+            hand (int): HAND_LEFT or HAND_RIGHT
+            gesture (int): Gesture value of the hand
+            a, b, c (float): Values, see EventType
+        """
+        now = time.monotonic()
+        if self.udp_port is None and now - self._scanned_at >= SUBSCRIBER_SCAN_INTERVAL:
+            self._scan(now)
+        self.seq += 1
+        EVENT.pack_into(
+            self._buffer, 0, event_type, hand, gesture, self.seq, now, a, b, c
+        )
+        for address in self._subscribers:
+            try:
+                self._socket.sendto(self._buffer, address)
+                self.sent += 1
+            except BlockingIOError:
+                # Full socket buffer of a slow subscriber
+                self.dropped += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Subscriber went away, its socket is left behind when it did not close it
+                self.dropped += 1
+                self._subscribers = tuple(
+                    known for known in self._subscribers if known != address
+                )
+                if self.udp_port is None:
+                    try:
+                        os.unlink(address)
+                    except OSError:
+                        pass
+
+    def close(self):
+        self._socket.close()
+
+
+class GestureEventSubscriber:
+    """Receives the events of a GestureEventPublisher"""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, udp_port=None, buffer_size=None):
+        """
+        Args:
+            directory (str): Directory holding one socket per subscriber, created when missing
+            udp_port (int): Listen on this localhost UDP port instead, the default when Unix sockets are not
+                available
+            buffer_size (int): Receive buffer size in bytes, the system default when None
+
+        Raises:
+            PermissionError: If other users can access directory, see private_directory
+        """
+        if udp_port is None and not unix_sockets_available():
+            udp_port = DEFAULT_UDP_PORT
+        self.path = None
+        self.received = 0
+        self.lost = 0
+        self._last_seq = None
+        if udp_port is None:
+            private_directory(directory)
+            self.path = os.path.join(directory, "{}.sock".format(os.getpid()))
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.bind(self.path)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.bind(("127.0.0.1", udp_port))
+        if buffer_size is not None:
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+
+    def receive(self, timeout=None):
+        """Method for waiting for the next event
+
+        Args:
+            timeout (float): Seconds to wait, None waits forever
+
+        Returns:
+            GestureEvent: Next event, None on timeout
+        """
+        if timeout is not None:
+            readable, _, _ = select.select([self._socket], [], [], timeout)
+            if not readable:
+                return None
+        event = decode_event(self._socket.recv(EVENT.size))
+        self.received += 1
+        if self._last_seq is not None and event.seq > self._last_seq + 1:
+            self.lost += event.seq - self._last_seq - 1
+        self._last_seq = event.seq
+        return event
+
+    def poll(self):
+        """Method for taking every event already received without waiting
+
+        Returns:
+            List of GestureEvent: Events in order
+        """
+        events = []
+        while True:
+            event = self.receive(timeout=0)
+            if event is None:
+                return events
+            events.append(event)
+
+    def __iter__(self):
+        while True:
+            yield self.receive()
+
+    def close(self):
+        self._socket.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the events of a HandController")
+    parser.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--udp-port", type=int, default=None)
+    args = parser.parse_args()
+    with GestureEventSubscriber(args.directory, args.udp_port) as subscriber:
+        try:
+            for event in subscriber:
+                print(
+                    "#{} {} hand {} gesture {} values {} latency {:.3f} ms".format(
+                        event.seq,
+                        event.type.name,
+                        "left" if event.hand == HAND_LEFT else "right",
+                        event.gesture,
+                        tuple(round(value, 4) for value in event.values),
+                        1000.0 * (time.monotonic() - event.timestamp),
+                    )
+                )
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,229 @@
+import numpy as np
+
+# Finger order of the patterns and bit of each finger in the finger mask
+FINGERS = ("thumb", "index", "middle", "ring", "pinky")
+_FINGER_BITS = np.array([1, 2, 4, 8, 16], np.uint8)
+NUM_MASKS = 32
+
+
+def finger_mask(closed):
+    """Method for packing finger states into 5 bit masks, bit i set when finger i (thumb first) is closed
+
+    Args:
+        closed (np.ndarray): (..., 5) boolean array, see GestureUtil.fingers_closed
+
+    Returns:
+        np.ndarray: (...) uint8 masks in [0, 32)
+    """
+    return np.packbits(closed, axis=-1, bitorder="little")[..., 0]
+
+
+def pattern_masks(pattern):
+    """Method for listing the finger masks matched by a pattern
+
+    Args:
+        pattern (str): One character per finger, thumb first: "C" closed, "O" open, "-" either
+
+    Returns:
+        List of int: Matching masks
+    """
+    if len(pattern) != len(FINGERS) or set(pattern) - set("CO-"):
+        raise ValueError(
+            "Invalid finger pattern {!r}, expected 5 of C, O or -".format(pattern)
+        )
+    masks = []
+    for mask in range(NUM_MASKS):
+        if all(
+            state == "-" or (state == "C") == bool(mask & bit)
+            for state, bit in zip(pattern, _FINGER_BITS.tolist())
+        ):
+            masks.append(mask)
+    return masks
+
+
+def pinch_below(distance):
+    """Method for building a predicate true when thumb and index tips are closer than distance, in normalized
+    image units
+    """
+
+    def predicate(landmarks):
+        # Index finger tip minus thumb tip
+        delta = landmarks[8, :2] - landmarks[4, :2]
+        return float(np.hypot(delta[0], delta[1])) < distance
+
+    return predicate
+
+
+def angle_between(low, high):
+    """Method for building a predicate true when the thumb to middle finger angle, as returned by
+    GestureUtil.get_angle, lies in [low, high] degrees
+    """
+
+    def predicate(landmarks):
+        # Thumb IP minus middle finger tip
+        delta = landmarks[3, :2] - landmarks[12, :2]
+        return low <= float(np.degrees(np.arctan2(delta[1], delta[0]))) <= high
+
+    return predicate
+
+
+class GestureDefinition:
+    __slots__ = ("gesture", "pattern", "predicate", "handler")
+
+    def __init__(self, gesture, pattern, predicate=None, handler=None):
+        self.gesture = gesture
+        self.pattern = pattern
+        self.predicate = predicate
+        self.handler = handler
+
+
+class GestureRegistry:
+    """Gestures declared as finger patterns, compiled into a 32 entry lookup table indexed by the finger mask.
+
+    Gestures are tried in registration order, the first match wins. A gesture without predicate is decided
+    by the table alone. Gestures with a geometric predicate are only evaluated for the masks their pattern
+    matches, before the table entry. Any Enum member with an integer value below 256 can be registered, e.g.
+    from an application specific Enum, together with an optional handler run by HandController for the
+    right hand:
+
+        registry.register(MyGesture.THUMBS_UP, "OCCCC", handler=lambda controller, landmarks, panel: ...)
+        registry.register(MyGesture.PINCH, "OOCCC", pinch_below(0.05), before=HandGesture.ZOOM)
+    """
+
+    def __init__(self, default=None):
+        """
+        Args:
+            default (Enum): Gesture returned when nothing matches
+        """
+        self.default = default
+        self.definitions = []
+        self._by_value = {}
+        self._lut = np.zeros(NUM_MASKS, np.uint8)
+        self._guarded = [()] * NUM_MASKS
+        self._gestures = []
+        self._table = []
+        self.compile()
+
+    def register(self, gesture, pattern, predicate=None, handler=None, before=None):
+        """Method for adding a gesture
+
+        Args:
+            gesture (Enum): Gesture, its value identifies it in classify_batch results
+            pattern (str): Finger states thumb first, "C" closed, "O" open, "-" either
+            predicate (callable): Takes the (21, 3) landmarks and returns True when the gesture applies
+            handler (callable): Called as handler(controller, landmarks, drawable_img) when the right hand
+                makes the gesture, drawable_img may be None
+            before (Enum): Registered gesture to try after this one, e.g. to refine a built-in gesture with a
+                predicate. Appended after every registered gesture when None
+
+        Raises:
+            ValueError: If the value of gesture is taken or out of range, the pattern is invalid or before is
+                not registered
+
+        Returns:
+            GestureRegistry: self, so registrations can be chained
+        """
+        if not 0 <= gesture.value < 256:
+            raise ValueError("Gesture values must fit in a uint8")
+        known = self._by_value.get(gesture.value)
+        if known is not None and known is not gesture:
+            raise ValueError(
+                "{} and {} share the value {}".format(known, gesture, gesture.value)
+            )
+        pattern_masks(pattern)
+        definition = GestureDefinition(gesture, pattern, predicate, handler)
+        if before is None:
+            self.definitions.append(definition)
+        else:
+            registered = [known.gesture for known in self.definitions]
+            if before not in registered:
+                raise ValueError(
+                    "Cannot register {} before {}, which is not registered".format(
+                        gesture, before
+                    )
+                )
+            self.definitions.insert(registered.index(before), definition)
+        self.compile()
+        return self
+
+    def unregister(self, gesture):
+        """Method for removing every definition of a gesture"""
+        self.definitions = [
+            definition
+            for definition in self.definitions
+            if definition.gesture is not gesture
+        ]
+        self.compile()
+
+    def compile(self):
+        """Method for rebuilding the lookup table, called by register"""
+        self._gestures = [self.default] + [
+            definition.gesture for definition in self.definitions
+        ]
+        self._by_value = {
+            gesture.value: gesture for gesture in self._gestures if gesture is not None
+        }
+        lut = np.zeros(NUM_MASKS, np.uint8)
+        guarded = [[] for _ in range(NUM_MASKS)]
+        decided = np.zeros(NUM_MASKS, bool)
+        for index, definition in enumerate(self.definitions, start=1):
+            for mask in pattern_masks(definition.pattern):
+                if decided[mask]:
+                    continue
+                if definition.predicate is None:
+                    lut[mask] = index
+                    decided[mask] = True
+                else:
+                    guarded[mask].append((index, definition.predicate))
+        self._lut = lut
+        self._table = [self._gestures[index] for index in lut.tolist()]
+        self._guarded = [tuple(candidates) for candidates in guarded]
+        self._values = np.array(
+            [0 if gesture is None else gesture.value for gesture in self._gestures],
+            np.uint8,
+        )
+
+    def classify(self, mask, landmarks=None):
+        """Method for classifying one hand
+
+        Args:
+            mask (int): Finger mask of the hand
+            landmarks (np.ndarray): (21, 3) landmarks, needed when predicates are registered
+
+        Returns:
+            Enum: Gesture
+        """
+        for index, predicate in self._guarded[mask]:
+            if predicate(landmarks):
+                return self._gestures[index]
+        return self._table[mask]
+
+    def classify_batch(self, masks, landmarks=None):
+        """Method for classifying many hands
+
+        Args:
+            masks (np.ndarray): (N,) finger masks
+            landmarks (np.ndarray): (N, 21, 3) landmarks, needed when predicates are registered
+
+        Returns:
+            np.ndarray: (N,) uint8 gesture values
+        """
+        indices = self._lut[masks]
+        if any(self._guarded):
+            for hand, mask in enumerate(np.asarray(masks).tolist()):
+                for index, predicate in self._guarded[mask]:
+                    if predicate(landmarks[hand]):
+                        indices[hand] = index
+                        break
+        return self._values[indices]
+
+    def gesture(self, value):
+        """Method for getting the gesture of a value returned by classify_batch"""
+        return self._by_value[int(value)]
+
+    def handler(self, gesture):
+        """Method for getting the handler registered with a gesture, None when it has none"""
+        for definition in self.definitions:
+            if definition.gesture is gesture and definition.handler is not None:
+                return definition.handler
+        return None
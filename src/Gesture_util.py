@@ -1,6 +1,7 @@
-import math
-from enum import Enum
-from math import degrees
+from enum import Enum, IntEnum
+
+import numpy as np
+from GestureRegistry import GestureRegistry, finger_mask
 
 
 class HandGesture(Enum):
@@ -11,11 +12,145 @@ class HandGesture(Enum):
     ROTATE = 5
 
 
+class HandLandmark(IntEnum):
+    """Index of each of the 21 hand landmarks, same numbering as mediapipe.solutions.hands.HandLandmark"""
+
+    WRIST = 0
+    THUMB_CMC = 1
+    THUMB_MCP = 2
+    THUMB_IP = 3
+    THUMB_TIP = 4
+    INDEX_FINGER_MCP = 5
+    INDEX_FINGER_PIP = 6
+    INDEX_FINGER_DIP = 7
+    INDEX_FINGER_TIP = 8
+    MIDDLE_FINGER_MCP = 9
+    MIDDLE_FINGER_PIP = 10
+    MIDDLE_FINGER_DIP = 11
+    MIDDLE_FINGER_TIP = 12
+    RING_FINGER_MCP = 13
+    RING_FINGER_PIP = 14
+    RING_FINGER_DIP = 15
+    RING_FINGER_TIP = 16
+    PINKY_MCP = 17
+    PINKY_PIP = 18
+    PINKY_DIP = 19
+    PINKY_TIP = 20
+
+
+NUM_LANDMARKS = 21
+
+# Joints compared by the finger closed test, one column per finger (thumb, index, middle, ring, pinky).
+# The thumb folds sideways so its x coordinate is compared, the other fingers use y.
+_FINGER_PIP = np.array([2, 6, 10, 14, 18])
+_FINGER_DIP = np.array([3, 7, 11, 15, 19])
+_FINGER_TIP = np.array([4, 8, 12, 16, 20])
+_FINGER_AXIS = np.array([0, 1, 1, 1, 1])
+_FINGER_JOINTS = np.stack([_FINGER_PIP, _FINGER_DIP, _FINGER_TIP])
+
+
+def as_landmark_array(hand_landmarks):
+    """Method for converting the landmarks of one hand into a (21, 3) float32 array of normalized x, y, z.
+    Arrays are returned as is so that callers can pass either representation.
+
+    Args:
+        hand_landmarks (Mediapipe hand landmarks or np.ndarray): Landmarks of a single hand
+
+    Returns:
+        np.ndarray: (21, 3) float32 landmark array
+    """
+    if isinstance(hand_landmarks, np.ndarray):
+        return hand_landmarks
+    return np.array(
+        [(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark], dtype=np.float32
+    )
+
+
+def landmarks_to_array(multi_hand_landmarks):
+    """Method for converting every detected hand of a frame into one array
+
+    Args:
+        multi_hand_landmarks (List of Mediapipe hand landmarks): results.multi_hand_landmarks, may be None
+
+    Returns:
+        np.ndarray: (hands, 21, 3) float32 landmark array, (0, 21, 3) when no hand was detected
+    """
+    if not multi_hand_landmarks:
+        return np.empty((0, NUM_LANDMARKS, 3), dtype=np.float32)
+    return np.array(
+        [
+            [(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark]
+            for hand_landmarks in multi_hand_landmarks
+        ],
+        dtype=np.float32,
+    )
+
+
+def hands_from_results(results):
+    """Method for converting a mediapipe Hands result once per frame
+
+    Args:
+        results (Mediapipe hands result): Output of Hands.process
+
+    Returns:
+        (np.ndarray, List of str): (hands, 21, 3) landmark array and "Left"/"Right" label of each hand
+    """
+    landmarks = landmarks_to_array(results.multi_hand_landmarks)
+    labels = [
+        handedness.classification[0].label
+        for handedness in (results.multi_handedness or [])
+    ]
+    return landmarks, labels
+
+
+def bounding_box(hand_landmarks, width=1, height=1):
+    """Method to find the bounding box of a hand
+
+    Args:
+        hand_landmarks (Mediapipe hand landmarks or np.ndarray): Landmarks of one hand or (..., 21, 3) array
+        width (int): Image width, 1 keeps normalized coordinates
+        height (int): Image height, 1 keeps normalized coordinates
+
+    Returns:
+        np.ndarray: (..., 4) array of min x, min y, max x, max y
+    """
+    xy = as_landmark_array(hand_landmarks)[..., :2] * (width, height)
+    return np.concatenate([xy.min(axis=-2), xy.max(axis=-2)], axis=-1)
+
+
+def default_registry():
+    """Method for building a registry holding the built-in gestures, checked in the order of the former
+    if/elif chain
+
+    Returns:
+        GestureRegistry: Registry returning HandGesture.OPEN when no gesture matches
+    """
+    return (
+        GestureRegistry(default=HandGesture.OPEN)
+        .register(HandGesture.CLOSE, "CCCCC")
+        .register(HandGesture.ZOOM, "OOCCC")
+        .register(HandGesture.ROTATE, "OOOCC")
+        .register(HandGesture.DRAW, "COCCC")
+    )
+
+
 class GestureUtil:
-    """Utility class for detecting hand gestures using mediapipe hand landmarks."""
+    """Utility class for detecting hand gestures using mediapipe hand landmarks.
 
-    def __init__(self, mp_hands):
+    Every method works on landmark arrays of shape (..., 21, 3), so a single hand, all hands of a frame or
+    a stack of recorded frames are handled with the same vectorized code. Mediapipe landmark messages are
+    accepted as well and converted on the fly. Gestures are looked up in a GestureRegistry, new ones are
+    added with gesture_utils.registry.register.
+    """
+
+    def __init__(self, mp_hands, registry=None):
+        """
+        Args:
+            mp_hands (mediapipe.solutions.hands): Kept for backward compatibility
+            registry (GestureRegistry): Gestures to detect, the built-in ones when None
+        """
         self.mp_hands = mp_hands
+        self.registry = default_registry() if registry is None else registry
 
     def determine_gesture(self, hand_landmarks):
         """Method to determine the position of fingers irrespective of left or right hand. Details of points is available at
@@ -24,91 +159,75 @@ class GestureUtil:
             hand_landmarks ((x,y) of all 21 hand landmarks): Hand landmark points position in terms of 2d coordinates
 
         Returns:
-            HandGesture: If hand is open, close, or any other gesture
+            HandGesture: If hand is open, close, or any other registered gesture
         """
-        is_thumb_closed = self.is_finger_closed(
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_MCP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_IP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_TIP].x,
+        landmarks = as_landmark_array(hand_landmarks)
+        return self.registry.classify(
+            int(finger_mask(self.fingers_closed(landmarks))), landmarks
         )
 
-        is_index_finger_closed = self.is_finger_closed(
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_PIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_DIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_TIP].y,
-        )
+    def classify_batch(self, landmarks):
+        """Method for classifying many hands in one call, e.g. every frame of a recorded session
 
-        is_middle_finger_closed = self.is_finger_closed(
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_PIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_DIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP].y,
-        )
+        Args:
+            landmarks (np.ndarray): (N, 21, 3) landmark array
 
-        is_ring_finger_closed = self.is_finger_closed(
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_PIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_DIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_TIP].y,
+        Returns:
+            np.ndarray: (N,) uint8 array holding the gesture value of each hand, see GestureRegistry.gesture
+        """
+        landmarks = np.asarray(landmarks)
+        return self.registry.classify_batch(
+            finger_mask(self.fingers_closed(landmarks)), landmarks
         )
 
-        is_pinky_finger_closed = self.is_finger_closed(
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_PIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_DIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_TIP].y,
-        )
-        print()
-        if (
-            is_thumb_closed
-            and is_index_finger_closed
-            and is_middle_finger_closed
-            and is_ring_finger_closed
-            and is_pinky_finger_closed
-        ):
-            return HandGesture.CLOSE
-        elif (
-            not is_thumb_closed
-            and not is_index_finger_closed
-            and is_middle_finger_closed
-            and is_ring_finger_closed
-            and is_pinky_finger_closed
-        ):
-            return HandGesture.ZOOM
-        elif (
-            not is_thumb_closed
-            and not is_index_finger_closed
-            and not is_middle_finger_closed
-            and is_ring_finger_closed
-            and is_pinky_finger_closed
-        ):
-            return HandGesture.ROTATE
-        elif (
-            is_thumb_closed
-            and is_middle_finger_closed
-            and is_ring_finger_closed
-            and is_pinky_finger_closed
-            and not is_index_finger_closed
-        ):
-            return HandGesture.DRAW
-        else:
-            return HandGesture.OPEN
+    def fingers_closed(self, landmarks):
+        """Method to determine which fingers are closed
+
+        Args:
+            landmarks (np.ndarray): (..., 21, 3) landmark array
+
+        Returns:
+            np.ndarray: (..., 5) boolean array ordered thumb, index, middle, ring, pinky
+        """
+        # One gather of the (3, 5) compared coordinates: pip, dip and tip rows, one column per finger
+        joints = landmarks[..., _FINGER_JOINTS, _FINGER_AXIS]
+        pip, dip, tip = joints[..., 0, :], joints[..., 1, :], joints[..., 2, :]
+        return ~((dip < pip) & (tip < dip))
 
     def get_angle(self, hand_landmarks):
         """Method to find angle of rotation w.r.t thumb and middle finger
 
         Args:
-            hand_landmarks (Mediapipe hand landmarks): Mediapipe hand landmarks
+            hand_landmarks (Mediapipe hand landmarks or np.ndarray): Landmarks of one hand or (..., 21, 3) array
 
         Returns:
-            Degree of rotation: Degree
+            Degree of rotation: Degree, one per hand when several hands are given
         """
-        x1 = hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_IP].x
-        y1 = hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_IP].y
-        x2 = hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP].x
-        y2 = hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP].y
+        landmarks = as_landmark_array(hand_landmarks)
+        thumb = landmarks[..., HandLandmark.THUMB_IP, :2]
+        middle = landmarks[..., HandLandmark.MIDDLE_FINGER_TIP, :2]
+        delta = thumb - middle
+        angle = np.degrees(np.arctan2(delta[..., 1], delta[..., 0]))
+        return float(angle) if angle.ndim == 0 else angle
+
+    def pinch_distance(self, hand_landmarks, width, height):
+        """Method to find the distance between thumb tip and index finger tip in pixels
 
-        radians = math.atan2(y1 - y2, x1 - x2)
-        degrees = math.degrees(radians)
+        Args:
+            hand_landmarks (Mediapipe hand landmarks or np.ndarray): Landmarks of one hand or (..., 21, 3) array
+            width (int): Image width
+            height (int): Image height
 
-        return degrees
+        Returns:
+            float: Pinch distance, one per hand when several hands are given
+        """
+        landmarks = as_landmark_array(hand_landmarks)
+        delta = (
+            landmarks[..., HandLandmark.INDEX_FINGER_TIP, :2]
+            - landmarks[..., HandLandmark.THUMB_TIP, :2]
+        ) * (width, height)
+        distance = np.hypot(delta[..., 0], delta[..., 1])
+        return float(distance) if distance.ndim == 0 else distance
 
     def is_finger_closed(self, pip, dip, tip):
         """Method to determine if finger is closed or open
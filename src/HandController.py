@@ -1,12 +1,35 @@
+import time
+
+# Reference of the startup report, taken before the heavy imports
+STARTED_AT = time.perf_counter()
+
 import cv2
 import os
-import mediapipe as mp
-import math
-from google.protobuf.json_format import MessageToDict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from Gesture_util import *
 import numpy as np
 from Gesture_util import GestureUtil
 from ImageUtil import ImageUtils
+from FramePipeline import FramePipeline
+from DrawingCanvas import DrawingCanvas
+from TransformEngine import TransformEngine
+from LandmarkRecording import LandmarkRecorder
+from InferenceScheduler import InferenceScheduler, mediapipe_detector
+from FrameStats import FrameStats
+from VideoRecorder import VideoRecorder
+from FramePool import FramePool
+from Letterbox import Letterbox
+from PreviewServer import PreviewServer
+from QualityGovernor import QUALITY_LEVELS, QualityGovernor, without_model_complexity
+from GestureEventBus import (
+    HAND_LEFT,
+    HAND_RIGHT,
+    EventType,
+    GestureEventPublisher,
+)
+
+IMPORTED_AT = time.perf_counter()
 
 
 class HandController:
@@ -17,156 +40,911 @@ class HandController:
     4. Edit control using left hand. Close left hand for enabling editing controls.
     """
 
-    def __init__(self) -> None:
-        self.mp_hands = mp.solutions.hands
-        self.gesture_utils = GestureUtil(self.mp_hands)
-        self.image_width, self.image_height = 640, 480
+    def __init__(
+        self,
+        pipelined=False,
+        queue_size=1,
+        record_path=None,
+        inference_stride=1,
+        roi_tracking=False,
+        frame_stats=None,
+        stats_overlay=False,
+        video_recorder=None,
+        display_size=(640, 480),
+        inference_size=None,
+        event_publisher=None,
+        exit_after_first_frame=False,
+        quality_governor=None,
+        preview_server=None,
+    ) -> None:
+        """
+        Args:
+            pipelined (bool): Run capture, inference, gesture logic and display as concurrent stages
+                joined by bounded queues instead of one serial loop
+            queue_size (int): Capacity of the queues between pipeline stages. Stale frames are dropped
+                when a queue is full so that inference always works on the newest frame
+            record_path (str): File receiving the detected landmarks of every frame, see LandmarkRecorder
+            inference_stride (int): Run hand tracking at most every inference_stride frames and predict the
+                landmarks in between, see InferenceScheduler
+            roi_tracking (bool): Run hand tracking on a crop around the hands of the previous frame, needs an
+                inference_stride above 1 as cropping requires static image mode
+            frame_stats (FrameStats): Receives the latency of every stage, a disabled instance when None
+            stats_overlay (bool): Write the statistics on the control panel, toggled with the "s" key
+            video_recorder (VideoRecorder): Records the displayed frames in the background, defaults to
+                output.avi at 20 fps. With source "camera" it records the mirrored camera frames instead,
+                before zoom, rotation and drawing
+            display_size ((int, int)): Width and height at which frames are captured, displayed and recorded
+            inference_size ((int, int)): Width and height of the copy given to hand tracking, letterboxed when
+                the aspect ratio differs. None tracks on the display frame
+            event_publisher (GestureEventPublisher): Receives gesture changes, zoom, rotation and drawn points
+                for other applications
+            exit_after_first_frame (bool): Stop once the first frame is shown, to measure the startup time
+            quality_governor (QualityGovernor): Lowers the hand model, inference rate, inference size and
+                landmark overlays while frames take longer than its budget. Serial frames are timed from
+                capture to display, pipelined frames by the display interval as their stages overlap
+            preview_server (PreviewServer): Streams the displayed frames to browsers
+        """
+        self.startup_times = {"imports": IMPORTED_AT - STARTED_AT}
+        self.exit_after_first_frame = exit_after_first_frame
+        self.gesture_utils = GestureUtil(None)
+        self.image_width, self.image_height = display_size
+        self.inference_size = None if inference_size is None else tuple(inference_size)
+        self._base_inference_size = self.inference_size
+        self._letterbox = None
+        self.event_publisher = event_publisher
+        self._published_gestures = {
+            HAND_LEFT: HandGesture.OPEN,
+            HAND_RIGHT: HandGesture.OPEN,
+        }
         self.curr_factor = -100
         self.rotate_factor = -100.0
+        self.rotate_base = 0.0
+        self.right_hand_gesture = HandGesture.OPEN
+        self.transform = TransformEngine()
         self.is_editable = False
-        self.image_utils = ImageUtils(self.mp_hands)
-        self.drawable_xy = list()
-        self.drawable_y = list()
+        self.image_utils = ImageUtils(None)
+        self.canvas = DrawingCanvas()
+        self.key_commands = deque()
+        self.drawable_img = None
+        self.pipelined = pipelined
+        self.queue_size = queue_size
+        self.record_path = record_path
+        self.recorder = None
+        self.inference_stride = inference_stride
+        self._base_inference_stride = inference_stride
+        if roi_tracking and inference_stride < 2:
+            raise ValueError(
+                "roi_tracking needs an inference_stride above 1, static image mode detection on every "
+                "frame costs more than video mode tracking"
+            )
+        self.roi_tracking = roi_tracking
+        self.scheduler = None
+        self.frame_stats = (
+            FrameStats(enabled=False) if frame_stats is None else frame_stats
+        )
+        self.stats_overlay = stats_overlay
+        self.video_recorder = video_recorder
+        # Frames handed between stages are acquired and released, see release_frame and release_composite
+        self.frame_pool = FramePool()
+        self._capture_buffer = None
+        self.hands = None
+        self.model_complexity = None
+        self.model_complexity_supported = True
+        self._executor = None
+        self._pending_hands = None
+        self._captured_at = None
+        self._shown_at = None
+        self.quality_governor = quality_governor
+        self.preview_server = preview_server
+        self.quality_level = QUALITY_LEVELS[0]
+        # Level asked for by the display thread and level prepare_hands last applied on the inference thread
+        self._requested_level = None
+        self._applied_level = None
+        if quality_governor is not None:
+            # No frame loop runs yet, the tracker is created with this level
+            self.quality_level = quality_governor.level
+            self._switch_quality_level(quality_governor.level)
+        self.mark_startup("controller")
+
+    @property
+    def mp_hands(self):
+        """mediapipe.solutions.hands, imported on first use as importing mediapipe takes seconds"""
+        import mediapipe as mp
+
+        return mp.solutions.hands
+
+    def mark_startup(self, step):
+        """Method for recording the seconds elapsed since this module was imported when a startup step is
+        done, the interpreter start before that is not counted
+        """
+        if step not in self.startup_times:
+            self.startup_times[step] = time.perf_counter() - STARTED_AT
+
+    def startup_report(self):
+        """Method for summarising the startup steps done so far
+
+        Returns:
+            str: Human readable report
+        """
+        return ", ".join(
+            "{} {:.2f} s".format(step, seconds)
+            for step, seconds in self.startup_times.items()
+        )
+
+    def create_hands(self):
+        """Method for creating the hand tracker and running it once on a blank frame, so that importing
+        mediapipe, loading the model and starting its graph are done before the first camera frame
+
+        Returns:
+            mediapipe.solutions.hands.Hands: Ready hand tracker, to be closed by the caller
+        """
+        kwargs = dict(
+            static_image_mode=self.roi_tracking,
+            min_detection_confidence=0.7,
+            min_tracking_confidence=0.7,
+        )
+        if self.model_complexity is not None and self.model_complexity_supported:
+            kwargs["model_complexity"] = self.model_complexity
+        try:
+            hands = self.mp_hands.Hands(**kwargs)
+        except TypeError:
+            if "model_complexity" not in kwargs:
+                raise
+            # mediapipe before 0.8.7 has a single hand model
+            self.model_complexity_supported = False
+            del kwargs["model_complexity"]
+            hands = self.mp_hands.Hands(**kwargs)
+        width, height = self.inference_size or (self.image_width, self.image_height)
+        hands.process(np.zeros((height, width, 3), np.uint8))
+        return hands
 
     def start_reading_cam(self):
 
+        # Kept for the trackers of other model complexities requested by the quality governor
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        # Opening the camera, often the slowest step, overlaps with the tracker and indicator setup
+        hands_future = self._executor.submit(self.create_hands)
+        hud_future = self._executor.submit(
+            self.image_utils.get_hud_layer, self.image_width, self.image_height
+        )
         cap = cv2.VideoCapture(0)
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.image_width)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.image_height)
-        fourcc = cv2.VideoWriter_fourcc(*"XVID")
-        out = cv2.VideoWriter("output.avi", fourcc, 20.0, (1280, 480))
-        with self.mp_hands.Hands(
-            min_detection_confidence=0.7, min_tracking_confidence=0.7
-        ) as hands:
-            while cap.isOpened():
-                success, image = cap.read()
-                image = cv2.resize(image, (self.image_width, self.image_height))
-
-                if not success:
-                    print("Ignoring empty camera frame.")
-                    # If loading a video, use 'break' instead of 'continue'.
-                    continue
-
-                # Flip the image horizontally for a later selfie-view display, and convert
-                # the BGR image to RGB.
-                image = cv2.cvtColor(cv2.flip(image, 1), cv2.COLOR_BGR2RGB)
-
-                # To improve performance, optionally mark the image as not writeable to
-                # pass by reference.
-                image.flags.writeable = False
-                results = hands.process(image)
-
-                # Draw the hand annotations on the image.
-                image.flags.writeable = True
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-                self.image_height, self.image_width, _ = image.shape
-
-                drawable_img = np.zeros(
-                    (self.image_height, self.image_width, 3), np.uint8
+        out = self.video_recorder
+        if out is None:
+            out = self.video_recorder = VideoRecorder("output.avi", fps=20.0)
+        governor = self.quality_governor
+        # Whatever fails, the camera, the recorders and the trackers are released. The frame loops only
+        # return once no other thread uses them.
+        try:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.image_width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.image_height)
+            self.mark_startup("camera")
+            hands = self.hands = hands_future.result()
+            self.mark_startup("hands")
+            try:
+                hud_future.result()
+            except Exception as error:
+                # The first frame renders the indicators again and reports the error
+                print("Failed to prepare the indicators: {}".format(error))
+            self.mark_startup("indicators")
+            if governor is not None and not self.model_complexity_supported:
+                governor.levels = without_model_complexity(governor.levels)
+                self.quality_level = governor.level
+            if self.record_path is not None:
+                self.recorder = LandmarkRecorder(
+                    self.record_path, self.image_width, self.image_height
+                )
+            if self.pipelined:
+                self.run_pipelined(cap, hands, out)
+            else:
+                self.run_serial(cap, hands, out)
+        finally:
+            cap.release()
+            out.close()
+            self._executor.shutdown()
+            self._executor = None
+            if self._pending_hands is not None:
+                self.close_created_hands(self._pending_hands)
+                self._pending_hands = None
+            if self.hands is not None:
+                self.hands.close()
+                self.hands = None
+            if self.recorder is not None:
+                self.recorder.close()
+                self.recorder = None
+            cv2.destroyAllWindows()
+        print("Video recorder: {}".format(out.report()))
+        if governor is not None:
+            print("Quality governor: {}".format(governor.report()))
+        if self.preview_server is not None:
+            print("Preview server: {}".format(self.preview_server.report()))
+        if self.scheduler is not None:
+            print("Inference scheduler: {}".format(self.scheduler.report()))
+            self.scheduler = None
+        if self.frame_stats.enabled and self.frame_stats.dump_path:
+            self.frame_stats.dump(self.frame_stats.dump_path)
+
+    def run_serial(self, cap, hands, out):
+        """Method for running capture, inference, gesture logic and display one after the other"""
+        while cap.isOpened():
+            image = self.read_frame(cap)
+            if image is None:
+                continue
+            hands = self.prepare_hands(hands)
+            hands_xyz, labels = self.infer(hands, image)
+            composite = self.render_frame(image, hands_xyz, labels)
+            self.release_frame(image)
+            keep_running = self.show_frame(composite, out)
+            self.release_composite(composite)
+            if not keep_running:
+                break
+
+    def run_pipelined(self, cap, hands, out):
+        """Method for running capture, inference, gesture logic and display concurrently. Display stays
+        on the calling thread as required by cv2.imshow
+        """
+
+        def capture():
+            if not cap.isOpened():
+                raise StopIteration
+            return self.read_frame(cap)
+
+        def inference(image):
+            nonlocal hands
+            hands = self.prepare_hands(hands)
+            return (image,) + self.infer(hands, image)
+
+        def gesture(item):
+            composite = self.render_frame(*item)
+            self.release_frame(item[0])
+            return composite
+
+        def display(composite):
+            for index, frame_queue in enumerate(pipeline.queues):
+                self.frame_stats.set_drops(
+                    "queue {}".format(index), frame_queue.dropped
                 )
-                drawable_img = self.image_utils.add_indicators(drawable_img)
-                drawable_img = cv2.cvtColor(drawable_img, cv2.COLOR_RGB2BGR)
-                left_hand_gesture = HandGesture.OPEN
-                if results.multi_hand_landmarks:
-                    for idx, hand_landmarks in enumerate(results.multi_hand_landmarks):
-                        which_hand = (
-                            results.multi_handedness[idx].classification[0].label
+            keep_running = self.show_frame(composite, out)
+            self.release_composite(composite)
+            return keep_running
+
+        pipeline = FramePipeline(
+            capture,
+            [("inference", inference), ("gesture", gesture)],
+            ("display", display),
+            queue_size=self.queue_size,
+        )
+        # Frames dropped between stages go back to the pool as well
+        capture_queue, inference_queue, gesture_queue = pipeline.queues
+        capture_queue.on_drop = self.release_frame
+        inference_queue.on_drop = lambda item: self.release_frame(item[0])
+        gesture_queue.on_drop = self.release_composite
+        pipeline.run()
+
+    def read_frame(self, cap):
+        """Method for grabbing a webcam frame and preparing it for hand tracking
+
+        Args:
+            cap (cv2.VideoCapture): Opened webcam
+
+        Returns:
+            BGR Image: Resized, mirrored frame or None if the camera returned no frame
+        """
+        with self.frame_stats.stage("capture"):
+            success, image = cap.read(self._capture_buffer)
+        if not success:
+            print("Ignoring empty camera frame.")
+            self.frame_stats.drop("capture")
+            # If loading a video, use 'break' instead of 'continue'.
+            return None
+        self._capture_buffer = image
+        self._captured_at = time.perf_counter()
+        with self.frame_stats.stage("preprocess"):
+            return self.preprocess(image)
+
+    def preprocess(self, image):
+        """Method for preparing a BGR frame of any size for hand tracking and display
+
+        Args:
+            image (BGR): Camera or video frame
+
+        Returns:
+            BGR Image: Resized, mirrored frame acquired from self.frame_pool, to be given back with
+                release_frame once rendered
+        """
+        shape = (self.image_height, self.image_width, 3)
+        if image.shape != shape:
+            image = cv2.resize(
+                image,
+                (self.image_width, self.image_height),
+                dst=self.frame_pool.get("resized", shape),
+            )
+        # Flip the image horizontally for a later selfie-view display. It stays BGR, only the copy given
+        # to the model is converted to RGB.
+        return cv2.flip(image, 1, dst=self.frame_pool.acquire("frame", shape))
+
+    def release_frame(self, image):
+        """Method for giving a frame returned by preprocess back to the frame pool once nothing uses it"""
+        self.frame_pool.release("frame", image)
+
+    def release_composite(self, composite):
+        """Method for giving a frame returned by render_frame back to the frame pool once shown"""
+        self.frame_pool.release("composite", composite)
+
+    def prepare_hands(self, hands):
+        """Method for getting the hand tracker of the next frame, called on the inference thread. Applies
+        the quality level last requested by apply_quality_level, swaps in the tracker created for a new model
+        complexity once it is ready and keeps the inference scheduler in line with the inference stride.
+
+        Args:
+            hands (mediapipe.solutions.hands.Hands): Tracker of the previous frame
+
+        Returns:
+            mediapipe.solutions.hands.Hands: Tracker to use
+        """
+        level = self._requested_level
+        if level is not None and level is not self._applied_level:
+            self._switch_quality_level(level)
+        pending = self._pending_hands
+        if pending is not None and pending.done():
+            self._pending_hands = None
+            try:
+                replacement = pending.result()
+            except Exception as error:
+                print("Failed to switch the hand model: {}".format(error))
+            else:
+                hands.close()
+                hands = self.hands = replacement
+                if self.scheduler is not None:
+                    self.scheduler.detect = mediapipe_detector(hands)
+        if self.scheduler is not None:
+            self.scheduler.stride = self.inference_stride
+        elif self.inference_stride > 1 or self.roi_tracking:
+            self.scheduler = InferenceScheduler(
+                mediapipe_detector(hands),
+                stride=self.inference_stride,
+                roi=self.roi_tracking,
+            )
+        return hands
+
+    def apply_quality_level(self, level):
+        """Method for switching to a quality level of the quality governor, called on the display thread.
+        Only the drawing settings change here, the inference settings are left to prepare_hands on the
+        inference thread, which is the only one using them
+
+        Args:
+            level (QualityLevel): Level to apply
+        """
+        self.quality_level = level
+        self._requested_level = level
+
+    def _switch_quality_level(self, level):
+        """Method for applying the inference settings of a quality level. A tracker for a new model
+        complexity is created in the background and swapped in by prepare_hands
+        """
+        self._applied_level = level
+        if level.model_complexity != self.model_complexity:
+            self.model_complexity = level.model_complexity
+            if self._executor is not None and self.model_complexity_supported:
+                if self._pending_hands is not None:
+                    # Superseded before it was used
+                    self._pending_hands.add_done_callback(self.close_created_hands)
+                self._pending_hands = self._executor.submit(self.create_hands)
+        self.inference_stride = max(self._base_inference_stride, level.inference_stride)
+        if level.inference_scale == 1.0:
+            self.inference_size = self._base_inference_size
+        else:
+            width, height = self._base_inference_size or (
+                self.image_width,
+                self.image_height,
+            )
+            self.inference_size = (
+                max(1, int(round(width * level.inference_scale))),
+                max(1, int(round(height * level.inference_scale))),
+            )
+        self._letterbox = None
+
+    @staticmethod
+    def close_created_hands(future):
+        """Method for closing the tracker of a create_hands future that is no longer used, nothing was
+        created when it failed or was cancelled
+        """
+        if not future.cancelled() and future.exception() is None:
+            future.result().close()
+
+    def infer(self, hands, image):
+        """Method for detecting the hands of a frame, through the inference scheduler when enabled
+
+        Args:
+            hands (mediapipe.solutions.hands.Hands): Hand tracker
+            image (BGR): Frame returned by read_frame
+
+        Returns:
+            (np.ndarray, List of str): (hands, 21, 3) landmark array and "Left"/"Right" label of each hand
+        """
+        with self.frame_stats.stage("inference"):
+            letterbox = self.get_letterbox(image.shape[1], image.shape[0])
+            if letterbox is not None:
+                width, height = letterbox.dst_size
+                image = letterbox.apply(
+                    image, self.frame_pool.get("inference", (height, width, 3))
+                )
+            rgb = self.frame_pool.get("rgb", image.shape)
+            rgb.flags.writeable = True
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=rgb)
+            # To improve performance, optionally mark the image as not writeable to
+            # pass by reference.
+            image.flags.writeable = False
+            if self.scheduler is not None:
+                hands_xyz, labels = self.scheduler.process(image)
+            else:
+                hands_xyz, labels = hands_from_results(hands.process(image))
+            if letterbox is not None:
+                hands_xyz = letterbox.to_source(hands_xyz)
+            return hands_xyz, labels
+
+    def get_letterbox(self, width, height):
+        """Method for getting the mapping between display frames of the given size and inference frames
+
+        Returns:
+            Letterbox: None when hand tracking runs on the display frame itself
+        """
+        if self.inference_size is None or self.inference_size == (width, height):
+            return None
+        if self._letterbox is None or self._letterbox.src_size != (width, height):
+            self._letterbox = Letterbox((width, height), self.inference_size)
+        return self._letterbox
+
+    def render_frame(self, image, hands_xyz, labels):
+        """Method for applying hand gestures on the webcam frame and building the control panel
+
+        Args:
+            image (BGR): Frame returned by read_frame
+            hands_xyz (np.ndarray): (hands, 21, 3) landmark array returned by infer
+            labels (List of str): "Left" or "Right" for each hand
+
+        Returns:
+            BGR Image: Webcam frame and control panel side by side
+        """
+        if self.recorder is not None:
+            self.recorder.write(hands_xyz, labels)
+        out = self.video_recorder
+        if out is not None and out.source == "camera":
+            # Before render_landmarks draws the transformed view
+            with self.frame_stats.stage("write"):
+                out.write(image)
+        return self.render_landmarks(image, hands_xyz, labels)
+
+    def render_landmarks(self, image, hands_xyz, labels):
+        """Method for applying hand gestures given as landmark arrays, see render_frame
+
+        Args:
+            image (BGR): Frame returned by read_frame, left untouched
+            hands_xyz (np.ndarray): (hands, 21, 3) landmark array
+            labels (List of str): "Left" or "Right" for each hand
+
+        Returns:
+            BGR Image: Webcam frame and control panel side by side, acquired from self.frame_pool, to be
+                given back with release_composite once shown
+        """
+        self.image_height, self.image_width, _ = image.shape
+        # Both halves are rendered in place into the composite instead of being concatenated
+        composite = self.frame_pool.acquire(
+            "composite", (self.image_height, 2 * self.image_width, 3)
+        )
+        camera_view = composite[:, : self.image_width]
+        self.drawable_img = composite[:, self.image_width :]
+
+        frame_stats = self.frame_stats
+        with frame_stats.stage("hud"):
+            drawable_img = self.image_utils.compose_hud(self.drawable_img)
+        with frame_stats.stage("gesture"):
+            image, drawable_img = self.apply_gestures(
+                hands_xyz, labels, image, drawable_img
+            )
+        with frame_stats.stage("transform"):
+            self.transform.apply(image, dst=camera_view)
+            self.canvas.blend(camera_view)
+        if self.stats_overlay:
+            frame_stats.draw_overlay(drawable_img)
+        return composite
+
+    def apply_gestures(self, hands_xyz, labels, image, drawable_img=None):
+        """Method for updating zoom, rotation and drawing state from the hands of one frame
+
+        Args:
+            hands_xyz (np.ndarray): (hands, 21, 3) landmark array
+            labels (List of str): "Left" or "Right" for each hand
+            image (BGR): Webcam frame, only its size is used
+            drawable_img (BGR): Control panel receiving the hand overlays, None skips all drawing
+
+        Returns:
+            (BGR, BGR): Webcam frame and control panel
+        """
+        self.image_height, self.image_width = image.shape[:2]
+        self.canvas.ensure_size(self.image_width, self.image_height)
+        while self.key_commands:
+            command = self.key_commands.popleft()
+            getattr(self.transform if command == "reset" else self.canvas, command)()
+        self.right_hand_gesture = HandGesture.OPEN
+        left_hand_gesture = HandGesture.OPEN
+        for hand_landmarks, which_hand in zip(hands_xyz, labels):
+            if which_hand == "Left":
+                left_hand_gesture = self.gesture_utils.determine_gesture(hand_landmarks)
+                is_editable = left_hand_gesture == HandGesture.CLOSE
+                if is_editable != self.is_editable:
+                    self.publish_event(
+                        EventType.EDITABLE, HAND_LEFT, left_hand_gesture, is_editable
+                    )
+                self.is_editable = is_editable
+                self.publish_gesture(HAND_LEFT, left_hand_gesture)
+                # if (self.is_editable):
+                # image = self.image_utils.blend_magic_circle(image, hand_landmarks)
+                if drawable_img is not None:
+                    self.image_utils.draw_hand_landmarks(
+                        drawable_img,
+                        hand_landmarks,
+                        joints=self.quality_level.draw_joints,
+                        skeleton=self.quality_level.draw_skeleton,
+                    )
+            elif which_hand == "Right":
+                if left_hand_gesture:
+                    image, drawable_img = self.perform_right_hand_operation(
+                        None, hand_landmarks, image, drawable_img
+                    )
+                    if drawable_img is not None:
+                        self.image_utils.draw_hand_landmarks(
+                            drawable_img,
+                            hand_landmarks,
+                            joints=self.quality_level.draw_joints,
+                            skeleton=self.quality_level.draw_skeleton,
                         )
-                        if which_hand == "Left":
-                            left_hand_gesture = self.gesture_utils.determine_gesture(
-                                hand_landmarks
-                            )
-                            self.is_editable = left_hand_gesture == HandGesture.CLOSE
-                            # if (self.is_editable):
-                            # image = self.image_utils.blend_magic_circle(image, hand_landmarks)
-                            self.image_utils.draw_hand_landmarks(
-                                drawable_img, hand_landmarks
-                            )
-                            which_hand = ""
-                        elif which_hand == "Right":
-                            if left_hand_gesture:
-                                image, drawable_img = self.perform_right_hand_operation(
-                                    self.mp_hands, hand_landmarks, image, drawable_img
-                                )
-                                self.image_utils.draw_hand_landmarks(
-                                    drawable_img, hand_landmarks
-                                )
-                            which_hand = ""
-
-                image = cv2.hconcat([image, drawable_img])
-                cv2.imshow("MediaPipe Hands", image)
+
+        # Hands that are gone count as open
+        self.publish_gesture(HAND_LEFT, left_hand_gesture)
+        self.publish_gesture(HAND_RIGHT, self.right_hand_gesture)
+        # A new pinch, rotation or stroke starts whenever the right hand leaves the gesture
+        if self.right_hand_gesture != HandGesture.ZOOM:
+            self.curr_factor = -100
+        if self.right_hand_gesture != HandGesture.ROTATE:
+            self.rotate_factor = -100.0
+        if self.right_hand_gesture != HandGesture.DRAW:
+            self.canvas.end_stroke()
+        return image, drawable_img
+
+    def show_frame(self, image, out):
+        """Method for displaying and recording a rendered frame. Besides ESC to quit, "c" clears the drawing,
+        "u" undoes the last stroke, "r" resets zoom and rotation and "s" toggles the statistics overlay.
+
+        Args:
+            image (BGR): Frame returned by render_frame
+            out (VideoRecorder): Recorder queueing the frame
+
+        Returns:
+            boolean: False once the user pressed ESC
+        """
+        frame_stats = self.frame_stats
+        with frame_stats.stage("imshow"):
+            cv2.imshow("MediaPipe Hands", image)
+            key = cv2.waitKey(5) & 0xFF
+        if out.source != "camera":
+            with frame_stats.stage("write"):
                 out.write(image)
-                if cv2.waitKey(5) & 0xFF == 27:
-                    break
-        cap.release()
-        out.release()
-        cv2.destroyAllWindows()
+        if self.preview_server is not None:
+            with frame_stats.stage("preview"):
+                self.preview_server.publish(image)
+        frame_stats.set_drops("recorder", out.dropped)
+        frame_stats.frame_done()
+        if self.quality_governor is not None:
+            self.update_quality()
+        if "first frame" not in self.startup_times:
+            self.mark_startup("first frame")
+            print(
+                "Startup, since HandController was imported: {}".format(
+                    self.startup_report()
+                )
+            )
+            if self.exit_after_first_frame:
+                return False
+        # Applied by render_frame, which may run on another thread in pipelined mode
+        if key == ord("c"):
+            self.key_commands.append("clear")
+        elif key == ord("u"):
+            self.key_commands.append("undo")
+        elif key == ord("r"):
+            self.key_commands.append("reset")
+        elif key == ord("s"):
+            self.stats_overlay = not self.stats_overlay
+        return key != 27
+
+    def update_quality(self):
+        """Method for giving the time of the frame just shown to the quality governor and applying the level
+        it decides on
+        """
+        governor = self.quality_governor
+        now = time.perf_counter()
+        started_at = self._shown_at if self.pipelined else self._captured_at
+        self._shown_at = now
+        if started_at is None:
+            return
+        level = governor.update(now - started_at)
+        if level is not None:
+            print(
+                "Quality: {from} -> {to}, {reason} ({frame_ms:.1f} ms per frame, budget "
+                "{budget_ms:.1f} ms)".format(**governor.decisions[-1])
+            )
+            self.apply_quality_level(level)
+
+    def publish_event(self, event_type, hand, gesture, a=0.0, b=0.0, c=0.0):
+        """Method for sending an event to other applications when an event publisher is set, see
+        GestureEventBus.EventType for the meaning of the values
+        """
+        if self.event_publisher is not None:
+            self.event_publisher.publish(event_type, hand, gesture.value, a, b, c)
+
+    def publish_gesture(self, hand, gesture):
+        """Method for sending a GESTURE event when the gesture of a hand changed"""
+        if self._published_gestures[hand] != gesture:
+            self._published_gestures[hand] = gesture
+            self.publish_event(EventType.GESTURE, hand, gesture)
 
     def perform_right_hand_operation(
         self, mp_hands, hand_landmarks, image, drawable_img
     ):
+        """Method for zooming, rotating or drawing on the webcam frame according to the right hand gesture.
+        Zoom and rotation update self.transform, which render_frame applies once per frame.
+
+        Args:
+            mp_hands (mediapipe.solutions.hands): Kept for backward compatibility
+            hand_landmarks (np.ndarray or Mediapipe hand landmarks): (21, 3) landmarks of the right hand
+            image (BGR): Webcam frame
+            drawable_img (BGR): Control panel, None skips drawing the hand reference
+
+        Returns:
+            (BGR, BGR): Updated webcam frame and control panel
+        """
+        hand_landmarks = as_landmark_array(hand_landmarks)
         self.image_height, self.image_width, _ = image.shape
-        x1 = (
-            hand_landmarks.landmark[mp_hands.HandLandmark.THUMB_TIP].x
-            * self.image_width
-        )
-        y1 = (
-            hand_landmarks.landmark[mp_hands.HandLandmark.THUMB_TIP].y
-            * self.image_height
+        thumb_tip = hand_landmarks[HandLandmark.THUMB_TIP]
+        index_tip = hand_landmarks[HandLandmark.INDEX_FINGER_TIP]
+        x1, y1 = (
+            float(thumb_tip[0]) * self.image_width,
+            float(thumb_tip[1]) * self.image_height,
         )
-        x2 = (
-            hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP].x
-            * self.image_width
+        x2, y2 = (
+            float(index_tip[0]) * self.image_width,
+            float(index_tip[1]) * self.image_height,
         )
-        y2 = (
-            hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP].y
-            * self.image_height
+        length = self.gesture_utils.pinch_distance(
+            hand_landmarks, self.image_width, self.image_height
         )
-        length = math.hypot(x2 - x1, y2 - y1)
         factor = length / 5
 
         if self.is_editable:
             right_hand_gesture = self.gesture_utils.determine_gesture(
                 hand_landmarks=hand_landmarks
             )
+            self.right_hand_gesture = right_hand_gesture
+            self.publish_gesture(HAND_RIGHT, right_hand_gesture)
             if right_hand_gesture == HandGesture.ZOOM:
-                curr_length = length
                 if self.curr_factor != -100:
-                    image = self.image_utils.zoom_image(
-                        image, self.curr_factor - factor
-                    )
-                    start_xy = (int(x1), int(y1))
-                    end_xy = (int(x2), int(y2))
-                    self.image_utils.draw_hand_reference(
-                        drawable_img, (int(x1), int(y1)), (int(x2), int(y2))
+                    self.transform.add_zoom(self.curr_factor - factor)
+                    self.publish_event(
+                        EventType.ZOOM,
+                        HAND_RIGHT,
+                        right_hand_gesture,
+                        self.curr_factor - factor,
+                        self.transform.zoom_scale,
+                        self.transform.scale,
                     )
+                    if drawable_img is not None:
+                        self.image_utils.draw_hand_reference(
+                            drawable_img, (int(x1), int(y1)), (int(x2), int(y2))
+                        )
                 self.curr_factor = factor
             elif right_hand_gesture == HandGesture.ROTATE:
                 degrees = self.gesture_utils.get_angle(hand_landmarks)
                 if self.rotate_factor == -100.0:
                     self.rotate_factor = degrees
+                    self.rotate_base = self.transform.angle
                 else:
-                    image = self.image_utils.rotate_image(
-                        image, int(self.rotate_factor) - int(degrees)
+                    self.transform.set_rotation(
+                        self.rotate_base + int(self.rotate_factor) - int(degrees)
                     )
-                    self.image_utils.draw_hand_reference(
-                        drawable_img, (int(x1), int(y1)), (int(x2), int(y2))
+                    self.publish_event(
+                        EventType.ROTATE,
+                        HAND_RIGHT,
+                        right_hand_gesture,
+                        self.transform.angle,
                     )
+                    if drawable_img is not None:
+                        self.image_utils.draw_hand_reference(
+                            drawable_img, (int(x1), int(y1)), (int(x2), int(y2))
+                        )
             elif right_hand_gesture == HandGesture.DRAW:
-                x = (
-                    hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP].x
-                    * self.image_width
+                self.canvas.add_point(int(x2), int(y2))
+                self.publish_event(
+                    EventType.DRAW,
+                    HAND_RIGHT,
+                    right_hand_gesture,
+                    x2 / self.image_width,
+                    y2 / self.image_height,
                 )
-                y = (
-                    hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP].y
-                    * self.image_height
-                )
-                self.drawable_xy.append((int(x), int(y)))
-                self.image_utils.draw_on_screen(image, self.drawable_xy)
+            else:
+                handler = self.gesture_utils.registry.handler(right_hand_gesture)
+                if handler is not None:
+                    handler(self, hand_landmarks, drawable_img)
 
         return image, drawable_img
 
 
 if __name__ == "__main__":
-    hand_controller = HandController()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Control webcam using hand gestures")
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Run capture, inference, gesture logic and display as concurrent stages",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=1,
+        help="Capacity of the queues between pipeline stages",
+    )
+    parser.add_argument(
+        "--record",
+        default=None,
+        help="Record the detected landmarks of every frame to this file for replay",
+    )
+    parser.add_argument(
+        "--inference-stride",
+        type=int,
+        default=1,
+        help="Run hand tracking every N frames and predict landmarks in between",
+    )
+    parser.add_argument(
+        "--roi-tracking",
+        action="store_true",
+        help="Run hand tracking on a crop around the previously detected hands, needs --inference-stride 2 or more",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Measure the latency of every stage of the frame loop",
+    )
+    parser.add_argument(
+        "--stats-overlay",
+        action="store_true",
+        help="Show the latency statistics on the control panel, implies --stats",
+    )
+    parser.add_argument(
+        "--stats-dump",
+        default=None,
+        help="Append a JSON snapshot of the statistics to this file periodically, implies --stats",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between snapshots written to --stats-dump",
+    )
+    parser.add_argument("--output", default="output.avi", help="Recorded video file")
+    parser.add_argument(
+        "--output-fps",
+        type=float,
+        default=20.0,
+        help="Frame rate of the recorded video",
+    )
+    parser.add_argument(
+        "--output-source",
+        choices=("composite", "camera", "panel"),
+        default="composite",
+        help="Record the whole window, the camera frames before zoom, rotation and drawing, or only the control panel",
+    )
+    parser.add_argument(
+        "--segment-seconds",
+        type=float,
+        default=None,
+        help="Start a new video file after this many seconds",
+    )
+    parser.add_argument(
+        "--segment-mb",
+        type=float,
+        default=None,
+        help="Start a new video file once the current one reaches this size",
+    )
+    parser.add_argument(
+        "--display-size",
+        default="640x480",
+        help="WIDTHxHEIGHT at which frames are captured, displayed and recorded",
+    )
+    parser.add_argument(
+        "--inference-size",
+        default=None,
+        help="WIDTHxHEIGHT of the downscaled copy used for hand tracking, e.g. 320x240",
+    )
+    parser.add_argument(
+        "--events",
+        action="store_true",
+        help="Publish gesture events to local subscribers, see GestureEventBus",
+    )
+    parser.add_argument(
+        "--events-udp-port",
+        type=int,
+        default=None,
+        help="Publish gesture events over UDP on localhost instead of Unix sockets",
+    )
+    parser.add_argument(
+        "--target-fps",
+        type=float,
+        default=None,
+        help="Lower hand tracking and overlay quality when frames take longer than this rate allows",
+    )
+    parser.add_argument(
+        "--preview",
+        type=int,
+        default=None,
+        metavar="PORT",
+        help="Stream the displayed frames as MJPEG over HTTP on this port",
+    )
+    parser.add_argument(
+        "--preview-host",
+        default="127.0.0.1",
+        help="Interface of the preview server, 0.0.0.0 to allow viewers on the local network",
+    )
+    parser.add_argument(
+        "--exit-after-first-frame",
+        action="store_true",
+        help="Quit once the first frame is shown, after printing the startup time",
+    )
+    args = parser.parse_args()
+    if args.roi_tracking and args.inference_stride < 2:
+        parser.error("--roi-tracking needs --inference-stride 2 or more")
+    event_publisher = (
+        GestureEventPublisher(udp_port=args.events_udp_port)
+        if args.events or args.events_udp_port
+        else None
+    )
+    preview_server = (
+        PreviewServer(args.preview, args.preview_host).start()
+        if args.preview is not None
+        else None
+    )
+    hand_controller = HandController(
+        pipelined=args.pipelined,
+        queue_size=args.queue_size,
+        record_path=args.record,
+        inference_stride=args.inference_stride,
+        roi_tracking=args.roi_tracking,
+        frame_stats=FrameStats(
+            enabled=args.stats or args.stats_overlay or args.stats_dump is not None,
+            dump_path=args.stats_dump,
+            dump_interval=args.stats_interval,
+        ),
+        stats_overlay=args.stats_overlay,
+        video_recorder=VideoRecorder(
+            args.output,
+            fps=args.output_fps,
+            source=args.output_source,
+            max_seconds=args.segment_seconds,
+            max_bytes=int(args.segment_mb * 1e6) if args.segment_mb else None,
+        ),
+        display_size=[int(value) for value in args.display_size.split("x")],
+        inference_size=(
+            [int(value) for value in args.inference_size.split("x")]
+            if args.inference_size
+            else None
+        ),
+        event_publisher=event_publisher,
+        exit_after_first_frame=args.exit_after_first_frame,
+        preview_server=preview_server,
+        quality_governor=(
+            QualityGovernor(target_fps=args.target_fps) if args.target_fps else None
+        ),
+    )
     hand_controller.start_reading_cam()
+    if event_publisher is not None:
+        event_publisher.close()
+    if preview_server is not None:
+        preview_server.close()
@@ -1,10 +1,58 @@
+import hashlib
 import os
+import threading
+import time
 import cv2
-from PIL import Image
-from PIL import ImageFont
-from PIL import ImageDraw
 import numpy as np
-import mediapipe as mp
+from Gesture_util import as_landmark_array, bounding_box
+
+# Colors follow mediapipe's default hand drawing style. Each path is drawn as one polyline.
+_PALM_COLOR = (48, 48, 255)
+_FINGER_COLORS = [
+    (180, 229, 255),
+    (128, 64, 128),
+    (0, 204, 255),
+    (48, 255, 48),
+    (192, 101, 21),
+]
+_HAND_SKELETON = [
+    (np.array([1, 0, 5, 9, 13, 17, 0]), (128, 128, 128)),
+    (np.array([1, 2, 3, 4]), _FINGER_COLORS[0]),
+    (np.array([5, 6, 7, 8]), _FINGER_COLORS[1]),
+    (np.array([9, 10, 11, 12]), _FINGER_COLORS[2]),
+    (np.array([13, 14, 15, 16]), _FINGER_COLORS[3]),
+    (np.array([17, 18, 19, 20]), _FINGER_COLORS[4]),
+]
+_LANDMARK_COLORS = [_PALM_COLOR, _PALM_COLOR] + 3 * [_FINGER_COLORS[0]]
+for _color in _FINGER_COLORS[1:]:
+    _LANDMARK_COLORS += [_PALM_COLOR] + 3 * [_color]
+
+# Seconds between checks of the icon files for changes
+ASSET_CHECK_INTERVAL = 1.0
+
+# Indicator icons, found relative to this file so that the working directory does not matter
+ASSET_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "imgs"
+)
+# Rendered indicator layers are kept here, ready to blit, so that later starts need neither PIL nor the PNGs
+HUD_CACHE_DIR = os.environ.get(
+    "VISUALCONTROLLER_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "visualcontroller"),
+)
+_HUD_CACHE_VERSION = 1
+# Cached layers kept, the least recently used ones are deleted beyond that, as every window size and every
+# change of the icons gives a new one
+HUD_CACHE_ENTRIES = 8
+
+# Indicator layout on a panel of HUD_REFERENCE_SIZE: icon, icon position, label and label position relative
+# to the icon. Positions scale with the panel size, the icons and labels scale uniformly so they keep their
+# aspect ratio.
+HUD_REFERENCE_SIZE = (640, 480)
+_HUD_LAYOUT = (
+    ("zoom", (10, 10), "Zoom Controls", (100, 20)),
+    ("draw", (10, 420), "Draw Controls", (100, 30)),
+    ("rotate", (360, 10), "rotate Controls", (100, 20)),
+)
 
 
 class ImageUtils:
@@ -14,21 +62,44 @@ class ImageUtils:
     3. Drawing on image( Hand landmarks, rectangles, circle, line, text, blending images)
     """
 
-    def __init__(self, mp_hands):
+    def __init__(self, mp_hands, hud_cache_dir=HUD_CACHE_DIR):
+        """
+        Args:
+            mp_hands (mediapipe.solutions.hands): Kept for backward compatibility
+            hud_cache_dir (str): Directory caching the rendered indicator layers, None disables the cache
+        """
         self.zoom_scale = 0
         self.mp_hands = mp_hands
-        self.drawing_styles = mp.solutions.drawing_styles
-        self.mp_drawing = mp.solutions.drawing_utils
-        zoom_img_path = os.path.join(os.getcwd(), "imgs/zoom-b.png")
-        draw_img_path = os.path.join(os.getcwd(), "imgs/draw-b.png")
-        rotate_img_path = os.path.join(os.getcwd(), "imgs/rotate-b.png")
-        self.zoom_img = Image.open(zoom_img_path)
+        self.hud_cache_dir = hud_cache_dir
+        self.icon_paths = {
+            "zoom": os.path.join(ASSET_DIR, "zoom-b.png"),
+            "draw": os.path.join(ASSET_DIR, "draw-b.png"),
+            "rotate": os.path.join(ASSET_DIR, "rotate-b.png"),
+        }
+        self._hud_key = None
+        self._hud_bgr = None
+        self._hud_mask = None
+        self._assets_signature = None
+        self._assets_checked_at = 0.0
+        self._icons_signature = None
+        # The layer may be prepared on a startup thread while the first frame asks for it
+        self._hud_lock = threading.Lock()
+
+    def load_icons(self):
+        """Method for (re)loading the indicator icons resized to their on screen size. Only needed to render
+        an indicator layer that is not cached yet.
+        """
+        from PIL import Image
+
+        signature = self._get_assets_signature()
+        self.zoom_img = Image.open(self.icon_paths["zoom"])
         self.zoom_img = self.zoom_img.resize((100, 50), Image.BICUBIC)
         self.zoom_img.convert("RGB")
-        self.draw_img = Image.open(draw_img_path)
+        self.draw_img = Image.open(self.icon_paths["draw"])
         self.draw_img = self.draw_img.resize((100, 50), Image.BICUBIC)
-        self.rotate_img = Image.open(rotate_img_path)
+        self.rotate_img = Image.open(self.icon_paths["rotate"])
         self.rotate_img = self.rotate_img.resize((100, 50), Image.BICUBIC)
+        self._icons_signature = signature
 
     def zoom_image(self, image, scale):
         """Method for zooming webcam image at the center of frame by the factor of scale
@@ -74,70 +145,37 @@ class ImageUtils:
         )
         return result
 
-    def draw_hand_landmarks(self, image, hand_landmarks):
+    def draw_hand_landmarks(self, image, hand_landmarks, joints=True, skeleton=True):
         """Method for drawing bounding box at the detected hand
 
         Args:
             image (RGB): Webcam feed image
-            hand_landmarks (Mediapipe hand landmarks): Hand landmarks detected by mediapipe library
+            hand_landmarks (Mediapipe hand landmarks or np.ndarray): Hand landmarks detected by mediapipe library
+            joints (bool): Draw a dot on each landmark
+            skeleton (bool): Draw the lines joining the landmarks
         """
         height, width, channels = image.shape
-        self.mp_drawing.draw_landmarks(
-            image,
-            hand_landmarks,
-            self.mp_hands.HAND_CONNECTIONS,
-            self.drawing_styles.get_default_hand_landmark_style(),
-            self.drawing_styles.get_default_hand_connection_style(),
-        )
-        xlist = [
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.WRIST].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_MCP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_IP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_TIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_MCP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_PIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_DIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_TIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_MCP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_PIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_DIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_MCP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_PIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_DIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_TIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_PIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_DIP].x,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_TIP].x,
-        ]
-        ylist = [
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.WRIST].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_IP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_TIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_MCP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_PIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_DIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_TIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_MCP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_PIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_DIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_MCP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_PIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_DIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_TIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_MCP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_PIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_DIP].y,
-            hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_TIP].y,
-        ]
-        minx = min(xlist) * width
-        maxx = max(xlist) * width
-        miny = min(ylist) * height
-        maxy = max(ylist) * height
-        cv2.rectangle(
-            image, (int(minx), int(miny)), (int(maxx), int(maxy)), (255, 255, 255), 5
+        hand_landmarks = as_landmark_array(hand_landmarks)
+        points = np.clip(
+            hand_landmarks[:, :2] * (width, height), 0, (width - 1, height - 1)
+        ).astype(np.int32)
+        if skeleton:
+            for path, color in _HAND_SKELETON:
+                cv2.polylines(image, [points[path]], False, color, 2)
+        if joints:
+            for point, color in zip(points.tolist(), _LANDMARK_COLORS):
+                cv2.circle(image, point, 6, (224, 224, 224), cv2.FILLED)
+                cv2.circle(image, point, 5, color, cv2.FILLED)
+        minx, miny, maxx, maxy = (
+            np.clip(
+                bounding_box(hand_landmarks, width, height),
+                0,
+                (width - 1, height - 1, width - 1, height - 1),
+            )
+            .astype(np.int32)
+            .tolist()
         )
+        cv2.rectangle(image, (minx, miny), (maxx, maxy), (255, 255, 255), 5)
 
     def draw_hand_reference(self, drawable_img, start_xy, end_xy):
         """Method for drawing circle at index finger and thumb tip indicating the image editable reference
@@ -158,25 +196,184 @@ class ImageUtils:
             image (RGB): Webcam feed
             drawable_xy (List of (x,y)): List of position of hand movements while drawing
         """
-        for (x, y) in drawable_xy:
+        for x, y in drawable_xy:
             cv2.circle(image, (int(x), int(y)), 5, (0, 0, 255), cv2.FILLED)
 
     def add_indicators(self, image):
-        """Method for adding indicative images and text
+        """Method for adding indicative images and text on top of an image
+
+        Args:
+            image (BGR): Image on which the indicators are drawn in place
+
+        Returns:
+            BGR Image: The same image with indicators
+        """
+        hud_bgr, hud_mask = self.get_hud_layer(image.shape[1], image.shape[0])
+        return cv2.copyTo(hud_bgr, hud_mask, image)
+
+    def compose_hud(self, dst):
+        """Method for filling a blank control panel with the indicators. Cheaper than add_indicators as
+        the cached layer is copied as a whole instead of being masked.
 
         Args:
-            image ([type]): [description]
+            dst (BGR): Preallocated control panel buffer, overwritten
 
         Returns:
-            [type]: [description]
+            BGR Image: dst
         """
-        pil_image = Image.fromarray(image)
-        pil_image.paste(self.zoom_img, (10, 10))
-        pil_image.paste(self.draw_img, (10, 420))
-        pil_image.paste(self.rotate_img, (360, 10))
-        draw = ImageDraw.Draw(pil_image)
+        hud_bgr, _ = self.get_hud_layer(dst.shape[1], dst.shape[0])
+        np.copyto(dst, hud_bgr)
+        return dst
+
+    def get_hud_layer(self, width, height):
+        """Method for getting the pre-rendered indicator layer of the given resolution. The layer is
+        rendered once and cached until the resolution or the icon files change. Thread safe.
+
+        Args:
+            width (int): Width of the image the layer is composited on
+            height (int): Height of the image the layer is composited on
+
+        Returns:
+            (BGR Image, np.ndarray): Indicators on black background and uint8 mask of the pixels covered
+                by them
+        """
+        with self._hud_lock:
+            now = time.monotonic()
+            if (
+                self._assets_signature is None
+                or now - self._assets_checked_at >= ASSET_CHECK_INTERVAL
+            ):
+                self._assets_checked_at = now
+                self._assets_signature = self._get_assets_signature()
+            key = (width, height, self._assets_signature)
+            if key != self._hud_key:
+                self._hud_bgr, self._hud_mask = self._load_hud(width, height)
+                self._hud_key = key
+            return self._hud_bgr, self._hud_mask
+
+    def _load_hud(self, width, height):
+        """Method for reading an indicator layer from the cache, rendering and caching it when missing"""
+        path = None
+        if self.hud_cache_dir is not None:
+            key = repr(
+                (
+                    _HUD_CACHE_VERSION,
+                    width,
+                    height,
+                    self._assets_signature,
+                    HUD_REFERENCE_SIZE,
+                    _HUD_LAYOUT,
+                )
+            )
+            path = os.path.join(
+                self.hud_cache_dir,
+                "hud_{}x{}_{}.npy".format(
+                    width, height, hashlib.sha1(key.encode()).hexdigest()[:16]
+                ),
+            )
+            try:
+                layer = np.load(path)
+                if layer.shape == (height, width, 4) and layer.dtype == np.uint8:
+                    # Marks the entry as recently used for _prune_hud_cache
+                    os.utime(path)
+                    return (
+                        np.ascontiguousarray(layer[..., :3]),
+                        np.ascontiguousarray(layer[..., 3]),
+                    )
+            except (OSError, ValueError):
+                pass
+        if self._icons_signature != self._assets_signature:
+            self.load_icons()
+        hud_bgr, hud_mask = self._render_hud(width, height)
+        if path is not None:
+            try:
+                os.makedirs(self.hud_cache_dir, exist_ok=True)
+                # Written aside and renamed so that concurrent processes never read a partial file
+                partial_path = "{}.{}.tmp".format(path, os.getpid())
+                with open(partial_path, "wb") as cache_file:
+                    np.save(cache_file, np.dstack([hud_bgr, hud_mask]))
+                os.replace(partial_path, path)
+                self._prune_hud_cache()
+            except OSError:
+                pass
+        return hud_bgr, hud_mask
+
+    def _prune_hud_cache(self):
+        """Method for deleting the least recently used indicator layers beyond HUD_CACHE_ENTRIES"""
+        entries = []
+        for name in os.listdir(self.hud_cache_dir):
+            if name.startswith("hud_") and name.endswith(".npy"):
+                path = os.path.join(self.hud_cache_dir, name)
+                try:
+                    entries.append((os.stat(path).st_mtime_ns, path))
+                except OSError:
+                    pass
+        entries.sort(reverse=True)
+        for _, path in entries[HUD_CACHE_ENTRIES:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _get_assets_signature(self):
+        signature = []
+        for path in self.icon_paths.values():
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _render_hud(self, width, height):
+        hud_bgr = np.zeros((height, width, 3), np.uint8)
+        hud_mask = np.zeros((height, width), np.uint8)
+        scale_x = width / HUD_REFERENCE_SIZE[0]
+        scale_y = height / HUD_REFERENCE_SIZE[1]
+        scale = min(scale_x, scale_y)
+        for name, (x, y), text, text_xy in _HUD_LAYOUT:
+            tile_bgr, tile_mask = self._render_hud_tile(
+                getattr(self, name + "_img"), text, text_xy
+            )
+            if scale != 1.0:
+                size = (
+                    max(1, int(round(tile_bgr.shape[1] * scale))),
+                    max(1, int(round(tile_bgr.shape[0] * scale))),
+                )
+                tile_bgr = cv2.resize(tile_bgr, size, interpolation=cv2.INTER_AREA)
+                tile_mask = cv2.resize(tile_mask, size, interpolation=cv2.INTER_NEAREST)
+            x, y = int(round(x * scale_x)), int(round(y * scale_y))
+            tile_height = min(tile_bgr.shape[0], height - y)
+            tile_width = min(tile_bgr.shape[1], width - x)
+            if tile_height <= 0 or tile_width <= 0:
+                continue
+            hud_bgr[y : y + tile_height, x : x + tile_width] = tile_bgr[
+                :tile_height, :tile_width
+            ]
+            hud_mask[y : y + tile_height, x : x + tile_width] = tile_mask[
+                :tile_height, :tile_width
+            ]
+        return hud_bgr, hud_mask
+
+    def _render_hud_tile(self, icon, text, text_xy):
+        """Method for rendering an icon and its label at the reference size
+
+        Returns:
+            (BGR Image, np.ndarray): Tile and uint8 mask of the pixels covered by the icon and the text
+        """
+        from PIL import Image, ImageDraw
+
+        text_x, text_y = text_xy
+        _, _, text_right, text_bottom = ImageDraw.Draw(icon).textbbox(
+            (text_x, text_y), text
+        )
+        size = (max(icon.width, text_right), max(icon.height, text_bottom))
+        pil_image = Image.new("RGB", size)
+        pil_mask = Image.new("L", size)
+        pil_image.paste(icon, (0, 0))
+        pil_mask.paste(255, (0, 0, icon.width, icon.height))
         # font = ImageFont.truetype("sans-serif.ttf", 16)
-        draw.text((110, 30), "Zoom Controls", (255, 255, 255))
-        draw.text((110, 450), "Draw Controls", (255, 255, 255))
-        draw.text((460, 30), "rotate Controls", (255, 255, 255))
-        return np.asarray(pil_image)
+        ImageDraw.Draw(pil_image).text((text_x, text_y), text, (255, 255, 255))
+        ImageDraw.Draw(pil_mask).text((text_x, text_y), text, 255)
+        tile_bgr = cv2.cvtColor(np.asarray(pil_image), cv2.COLOR_RGB2BGR)
+        return tile_bgr, np.asarray(pil_mask).copy()
@@ -0,0 +1,388 @@
+import argparse
+import time
+
+import numpy as np
+from Gesture_util import GestureUtil, bounding_box, hands_from_results
+
+
+def mediapipe_detector(hands):
+    """Method for adapting a mediapipe Hands instance to the detect callable used by InferenceScheduler
+
+    Args:
+        hands (mediapipe.solutions.hands.Hands): Hand tracker
+
+    Returns:
+        callable: Takes an RGB image and returns (hands, 21, 3) normalized landmarks and labels
+    """
+    return lambda image: hands_from_results(hands.process(image))
+
+
+class InferenceScheduler:
+    """Decides when hand tracking really has to run and where.
+
+    The detector runs on every stride-th frame, or earlier when the hands are predicted to have moved more
+    than motion_threshold since the last detection. In between, landmarks are extrapolated with a constant
+    velocity model. Frames without hands are skipped the same way, so a hand entering the view is picked up
+    within stride frames. Detection runs on a padded crop around the predicted hands, with a full frame pass
+    every full_frame_interval detections, and whenever the crop loses a hand, to pick up new hands.
+
+    Most of the saving comes from skipped frames: MediaPipe resizes its input to a fixed size, so cropping
+    mainly cuts the conversion cost and gives small hands more pixels. When cropping, create Hands with
+    static_image_mode=True since its own tracking assumes an image that does not move between calls. Static
+    mode runs palm detection on every call, which costs more than video mode tracking on every frame, so
+    cropping is only allowed together with a stride above 1.
+    """
+
+    def __init__(
+        self,
+        detect,
+        stride=3,
+        motion_threshold=0.05,
+        roi=True,
+        roi_padding=0.3,
+        min_roi_size=0.25,
+        full_frame_interval=15,
+    ):
+        """
+        Args:
+            detect (callable): Takes an RGB image, returns (hands, 21, 3) normalized landmarks and labels
+            stride (int): Detect at least every stride frames, 1 detects on every frame
+            motion_threshold (float): Predicted displacement, in normalized units, forcing a detection
+            roi (bool): Detect on a crop around the hands of the previous frame
+            roi_padding (float): Padding added to each side of the hand box, relative to the box size
+            min_roi_size (float): Minimum side of the crop relative to the frame
+            full_frame_interval (int): Detections between full frame passes
+        """
+        if roi and stride < 2:
+            raise ValueError(
+                "roi needs a stride above 1, static mode detection on every frame costs more than "
+                "video mode tracking"
+            )
+        self.detect = detect
+        self.stride = max(1, stride)
+        self.motion_threshold = motion_threshold
+        self.roi = roi
+        self.roi_padding = roi_padding
+        self.min_roi_size = min_roi_size
+        self.full_frame_interval = full_frame_interval
+        self.reset()
+
+    def reset(self):
+        self.hands_xyz = np.empty((0, 21, 3), np.float32)
+        self.labels = []
+        self.velocity = np.zeros((0, 21, 3), np.float32)
+        # Detects on the first frame
+        self.frames_since_detection = self.stride
+        self.detections_since_full_frame = 0
+        self.frames = 0
+        self.detections = 0
+        self.roi_detections = 0
+        self.detected_pixels = 0
+        self.frame_pixels = 0
+        self.detect_time = 0.0
+
+    def process(self, image):
+        """Method for getting the hands of a frame, detected or predicted
+
+        Args:
+            image (RGB): Frame
+
+        Returns:
+            (np.ndarray, List of str): (hands, 21, 3) normalized landmarks and "Left"/"Right" labels
+        """
+        self.frames += 1
+        self.frame_pixels += image.shape[0] * image.shape[1]
+        steps = self.frames_since_detection + 1
+        predicted = self.hands_xyz + self.velocity * steps
+        motion = (
+            np.abs(self.velocity[..., :2]).max() * steps if len(self.velocity) else 0.0
+        )
+        if steps < self.stride and motion < self.motion_threshold:
+            self.frames_since_detection = steps
+            return predicted, self.labels
+
+        hands_xyz, labels = None, None
+        if (
+            self.roi
+            and len(self.hands_xyz)
+            and self.detections_since_full_frame < self.full_frame_interval
+        ):
+            hands_xyz, labels = self._detect_roi(image, predicted)
+            if len(hands_xyz) < len(self.hands_xyz):
+                hands_xyz = None
+        if hands_xyz is None:
+            hands_xyz, labels = self._detect(image)
+            self.detections_since_full_frame = 0
+        else:
+            self.detections_since_full_frame += 1
+
+        if labels == self.labels and len(hands_xyz):
+            self.velocity = (hands_xyz - self.hands_xyz) / steps
+        else:
+            self.velocity = np.zeros_like(hands_xyz)
+        self.hands_xyz, self.labels = hands_xyz, labels
+        self.frames_since_detection = 0
+        return hands_xyz, labels
+
+    def _detect(self, image):
+        start = time.perf_counter()
+        hands_xyz, labels = self.detect(image)
+        self.detect_time += time.perf_counter() - start
+        self.detections += 1
+        self.detected_pixels += image.shape[0] * image.shape[1]
+        return hands_xyz, labels
+
+    def _detect_roi(self, image, predicted):
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = self.roi_box(predicted)
+        x0, x1 = int(x0 * width), int(np.ceil(x1 * width))
+        y0, y1 = int(y0 * height), int(np.ceil(y1 * height))
+        crop = np.ascontiguousarray(image[y0:y1, x0:x1])
+        hands_xyz, labels = self._detect(crop)
+        self.roi_detections += 1
+        crop_width, crop_height = x1 - x0, y1 - y0
+        scale = np.array(
+            [crop_width / width, crop_height / height, crop_width / width], np.float32
+        )
+        offset = np.array([x0 / width, y0 / height, 0.0], np.float32)
+        return hands_xyz * scale + offset, labels
+
+    def roi_box(self, hands_xyz):
+        """Method for getting the padded crop around hands, same box as ImageUtils.draw_hand_landmarks
+
+        Args:
+            hands_xyz (np.ndarray): (hands, 21, 3) normalized landmarks
+
+        Returns:
+            (float, float, float, float): Normalized min x, min y, max x, max y clamped to the frame
+        """
+        boxes = bounding_box(hands_xyz)
+        low, high = boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)
+        size = np.maximum((high - low) * (1 + 2 * self.roi_padding), self.min_roi_size)
+        center = (low + high) / 2
+        low = np.clip(center - size / 2, 0.0, 1.0)
+        high = np.clip(center + size / 2, 0.0, 1.0)
+        return float(low[0]), float(low[1]), float(high[0]), float(high[1])
+
+    def report(self):
+        """Method for summarising how much detection work was done
+
+        Returns:
+            dict: Frames, detections, fraction of frames and pixels detected and mean detection time
+        """
+        return {
+            "frames": self.frames,
+            "detections": self.detections,
+            "roi_detections": self.roi_detections,
+            "detection_rate": self.detections / self.frames if self.frames else 0.0,
+            "pixel_rate": (
+                self.detected_pixels / self.frame_pixels if self.frame_pixels else 0.0
+            ),
+            "detect_ms": (
+                1000.0 * self.detect_time / self.detections if self.detections else 0.0
+            ),
+        }
+
+
+def compare_hands(reference, reference_labels, hands_xyz, labels, width, height):
+    """Method for measuring the landmark error of one frame against a reference, hands matched by label
+
+    Returns:
+        (List of float, int): Mean pixel error of each matched hand and number of unmatched hands
+    """
+    errors = []
+    matched = 0
+    for hand_xyz, label in zip(hands_xyz, labels):
+        if label not in reference_labels:
+            continue
+        matched += 1
+        delta = (hand_xyz[:, :2] - reference[reference_labels.index(label)][:, :2]) * (
+            width,
+            height,
+        )
+        errors.append(float(np.hypot(delta[:, 0], delta[:, 1]).mean()))
+    return errors, len(reference_labels) + len(labels) - 2 * matched
+
+
+def evaluate(frames, detect, width, height, reference_timing=None, **scheduler_kwargs):
+    """Method for measuring the accuracy and cost of scheduled inference against detecting every frame.
+
+    Args:
+        frames (iterable): Yields (image, reference landmarks, reference labels) per frame. The reference is
+            typically full frame detection, or recorded landmarks when replaying a LandmarkRecording
+        detect (callable): Detector used by the scheduler
+        width (int): Frame width used to express errors in pixels
+        height (int): Frame height used to express errors in pixels
+        reference_timing (dict): Receives in "seconds" the time spent producing the reference, see
+            video_frames, to compare the cost of scheduled inference with full frame video mode inference
+        scheduler_kwargs: Arguments of InferenceScheduler
+
+    Returns:
+        dict: InferenceScheduler.report plus mean/p95 landmark error in pixels, gesture agreement, number
+            of hands missed or hallucinated and time per frame, with the reference time per frame and the
+            relative cost when reference_timing is given
+    """
+    scheduler = InferenceScheduler(detect, **scheduler_kwargs)
+    gesture_utils = GestureUtil(None)
+    errors, agreements, mismatched = [], [], 0
+    scheduled_time = 0.0
+    for image, reference, reference_labels in frames:
+        start = time.perf_counter()
+        hands_xyz, labels = scheduler.process(image)
+        scheduled_time += time.perf_counter() - start
+        frame_errors, frame_mismatched = compare_hands(
+            reference, reference_labels, hands_xyz, labels, width, height
+        )
+        errors += frame_errors
+        mismatched += frame_mismatched
+        for hand_xyz, label in zip(hands_xyz, labels):
+            if label in reference_labels:
+                reference_xyz = reference[reference_labels.index(label)]
+                agreements.append(
+                    gesture_utils.classify_batch(hand_xyz[None])[0]
+                    == gesture_utils.classify_batch(reference_xyz[None])[0]
+                )
+    report = scheduler.report()
+    report.update(
+        {
+            "mean_error_px": float(np.mean(errors)) if errors else 0.0,
+            "p95_error_px": float(np.percentile(errors, 95)) if errors else 0.0,
+            "gesture_agreement": float(np.mean(agreements)) if agreements else 1.0,
+            "mismatched_hands": mismatched,
+            "frame_ms": (
+                1000.0 * scheduled_time / scheduler.frames if scheduler.frames else 0.0
+            ),
+        }
+    )
+    if reference_timing is not None and scheduler.frames:
+        report["reference_ms"] = 1000.0 * reference_timing["seconds"] / scheduler.frames
+        report["relative_cost"] = (
+            report["frame_ms"] / report["reference_ms"]
+            if report["reference_ms"]
+            else 0.0
+        )
+    return report
+
+
+def recording_frames(recording):
+    """Method for evaluating prediction only, without MediaPipe, using recorded landmarks as both the
+    detector output and the reference. Use with roi=False.
+
+    Args:
+        recording (LandmarkRecording): Recorded session
+
+    Returns:
+        (iterable, callable): Frames for evaluate and the matching detect callable
+    """
+    current = {}
+    image = np.zeros((1, 1, 3), np.uint8)
+
+    def frames():
+        for _, hands_xyz, labels in recording:
+            current["hands"] = (np.array(hands_xyz), labels)
+            yield image, current["hands"][0], labels
+
+    return frames(), lambda _: current["hands"]
+
+
+def video_frames(path, hands, width, height, timing=None):
+    """Method for reading a video, with full frame detection on every frame as the reference
+
+    Args:
+        path (str): Video file
+        hands (mediapipe.solutions.hands.Hands): Video mode hand tracker producing the reference
+        width (int): Frame width
+        height (int): Frame height
+        timing (dict): Accumulates in "seconds" the time spent in the reference tracker
+
+    Returns:
+        iterable: Frames for evaluate
+    """
+    import cv2
+
+    if timing is not None:
+        timing.setdefault("seconds", 0.0)
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            success, image = cap.read()
+            if not success:
+                break
+            image = cv2.cvtColor(
+                cv2.flip(cv2.resize(image, (width, height)), 1), cv2.COLOR_BGR2RGB
+            )
+            start = time.perf_counter()
+            results = hands.process(image)
+            if timing is not None:
+                timing["seconds"] += time.perf_counter() - start
+            yield (image,) + hands_from_results(results)
+    finally:
+        cap.release()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report accuracy against cost of scheduled hand tracking"
+    )
+    parser.add_argument("input", help="Video file or landmark recording (.vclm)")
+    parser.add_argument("--strides", default="1,2,3,4,6")
+    parser.add_argument("--motion-threshold", type=float, default=0.05)
+    parser.add_argument("--no-roi", action="store_true")
+    args = parser.parse_args()
+
+    print(
+        "stride  detections  pixels  detect ms  mean px  p95 px  gesture agree  mismatched  "
+        "relative cost"
+    )
+    for stride in [int(value) for value in args.strides.split(",")]:
+        if args.input.endswith(".vclm"):
+            from LandmarkRecording import LandmarkRecording
+
+            recording = LandmarkRecording(args.input)
+            frames, detect = recording_frames(recording)
+            width, height, roi = recording.width, recording.height, False
+            reference_timing = None
+        else:
+            import mediapipe as mp
+
+            width, height, roi = 640, 480, not args.no_roi and stride > 1
+            reference_timing = {}
+            reference_hands = mp.solutions.hands.Hands(
+                min_detection_confidence=0.7, min_tracking_confidence=0.7
+            )
+            scheduled_hands = mp.solutions.hands.Hands(
+                static_image_mode=roi,
+                min_detection_confidence=0.7,
+                min_tracking_confidence=0.7,
+            )
+            frames = video_frames(
+                args.input, reference_hands, width, height, reference_timing
+            )
+            detect = mediapipe_detector(scheduled_hands)
+        report = evaluate(
+            frames,
+            detect,
+            width,
+            height,
+            stride=stride,
+            motion_threshold=args.motion_threshold,
+            roi=roi,
+            reference_timing=reference_timing,
+        )
+        print(
+            "{:>6}  {:>10.0%}  {:>6.0%}  {:>9.2f}  {:>7.2f}  {:>6.2f}  {:>13.1%}  {:>10}  {:>13}".format(
+                stride,
+                report["detection_rate"],
+                report["pixel_rate"],
+                report["detect_ms"],
+                report["mean_error_px"],
+                report["p95_error_px"],
+                report["gesture_agreement"],
+                report["mismatched_hands"],
+                (
+                    "{:.0%}".format(report["relative_cost"])
+                    if "relative_cost" in report
+                    else "-"
+                ),
+            )
+        )
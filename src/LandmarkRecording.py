@@ -0,0 +1,231 @@
+import argparse
+import struct
+import time
+
+import numpy as np
+from Gesture_util import NUM_LANDMARKS
+
+MAGIC = b"VCLM"
+VERSION = 1
+MAX_HANDS = 2
+HANDEDNESS = {"Left": 0, "Right": 1}
+HANDEDNESS_LABELS = {value: label for label, value in HANDEDNESS.items()}
+
+# magic, version, max hands, landmarks per hand, record size, frame width, frame height
+HEADER = struct.Struct("<4sHHHIHH")
+HEADER_SIZE = 64
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp", "<f8"),
+        ("num_hands", "u1"),
+        ("handedness", "i1", (MAX_HANDS,)),
+        ("landmarks", "<f4", (MAX_HANDS, NUM_LANDMARKS, 3)),
+    ]
+)
+
+
+def pad_hands(hands_xyz, labels, gestures=None):
+    """Method for storing the hands of a frame in fixed size arrays. Frames with fewer than MAX_HANDS hands
+    are padded with NaN landmarks, handedness -1 and gesture 0
+
+    Args:
+        hands_xyz (np.ndarray): (hands, 21, 3) landmark array
+        labels (List of str): "Left" or "Right" for each hand
+        gestures (np.ndarray): HandGesture value of each hand, all 0 when None
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray): (MAX_HANDS, 21, 3) landmarks, (MAX_HANDS,) handedness and
+            (MAX_HANDS,) gestures
+    """
+    landmarks = np.full((MAX_HANDS, NUM_LANDMARKS, 3), np.nan, np.float32)
+    handedness = np.full(MAX_HANDS, -1, np.int8)
+    hand_gestures = np.zeros(MAX_HANDS, np.uint8)
+    num_hands = min(len(hands_xyz), MAX_HANDS)
+    landmarks[:num_hands] = hands_xyz[:num_hands]
+    handedness[:num_hands] = [HANDEDNESS[label] for label in labels[:num_hands]]
+    if gestures is not None:
+        hand_gestures[:num_hands] = gestures[:num_hands]
+    return landmarks, handedness, hand_gestures
+
+
+class LandmarkRecorder:
+    """Writes the per frame hand tracking output to a compact binary file.
+
+    The file is a 64 byte header followed by one fixed size record per frame (see RECORD_DTYPE), so it can be
+    appended to while recording and memory mapped for replay without any parsing.
+    """
+
+    def __init__(self, path, width, height):
+        """
+        Args:
+            path (str): Output file, overwritten
+            width (int): Width of the frames the landmarks were detected on
+            height (int): Height of the frames the landmarks were detected on
+        """
+        self.path = path
+        self.frames = 0
+        self._record = np.zeros(1, RECORD_DTYPE)
+        self._file = open(path, "wb")
+        header = HEADER.pack(
+            MAGIC,
+            VERSION,
+            MAX_HANDS,
+            NUM_LANDMARKS,
+            RECORD_DTYPE.itemsize,
+            width,
+            height,
+        )
+        self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def write(self, hands_xyz, labels, timestamp=None):
+        """Method for appending one frame
+
+        Args:
+            hands_xyz (np.ndarray): (hands, 21, 3) landmark array
+            labels (List of str): "Left" or "Right" for each hand
+            timestamp (float): Capture time in seconds, defaults to now
+        """
+        record = self._record
+        landmarks, handedness, _ = pad_hands(hands_xyz, labels)
+        record["timestamp"] = time.time() if timestamp is None else timestamp
+        record["num_hands"] = min(len(hands_xyz), MAX_HANDS)
+        record["landmarks"][0] = landmarks
+        record["handedness"][0] = handedness
+        self._file.write(record.tobytes())
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LandmarkRecording:
+    """Memory mapped, read only view of a file written by LandmarkRecorder. Only needs numpy."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as recording:
+            header = recording.read(HEADER_SIZE)
+            recording.seek(0, 2)
+            file_size = recording.tell()
+        if len(header) < HEADER.size:
+            raise ValueError("{} is not a landmark recording".format(path))
+        (
+            magic,
+            version,
+            max_hands,
+            num_landmarks,
+            record_size,
+            self.width,
+            self.height,
+        ) = HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError("{} is not a landmark recording".format(path))
+        if (
+            version != VERSION
+            or max_hands != MAX_HANDS
+            or num_landmarks != NUM_LANDMARKS
+            or record_size != RECORD_DTYPE.itemsize
+        ):
+            raise ValueError(
+                "Unsupported landmark recording version {} in {}".format(version, path)
+            )
+        # A recording interrupted mid-write may end with a partial record, which is ignored
+        count = max(file_size - HEADER_SIZE, 0) // RECORD_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(
+                path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,)
+            )
+        else:
+            self.records = np.empty(0, RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def timestamps(self):
+        return self.records["timestamp"]
+
+    @property
+    def landmarks(self):
+        """(frames, MAX_HANDS, 21, 3) landmarks, NaN for missing hands"""
+        return self.records["landmarks"]
+
+    @property
+    def handedness(self):
+        """(frames, MAX_HANDS) handedness, 0 for left, 1 for right and -1 for missing hands"""
+        return self.records["handedness"]
+
+    def frame(self, index):
+        """Method for getting one frame in the form consumed by HandController.apply_gestures
+
+        Returns:
+            (float, np.ndarray, List of str): Timestamp, (hands, 21, 3) landmarks and labels
+        """
+        record = self.records[index]
+        num_hands = int(record["num_hands"])
+        labels = [
+            HANDEDNESS_LABELS[int(value)] for value in record["handedness"][:num_hands]
+        ]
+        return float(record["timestamp"]), record["landmarks"][:num_hands], labels
+
+    def __iter__(self):
+        for index in range(len(self.records)):
+            yield self.frame(index)
+
+
+def replay(path, controller=None, out=None):
+    """Method for running the gesture and transform logic over a recording, without camera or MediaPipe
+
+    Args:
+        path (str): Recording written by LandmarkRecorder
+        controller (HandController): Controller receiving the frames, a new one when None
+        out (cv2.VideoWriter): When given, every frame is rendered on a black webcam frame and written
+
+    Returns:
+        HandController: Controller in its final state
+    """
+    from HandController import HandController
+
+    recording = LandmarkRecording(path)
+    if controller is None:
+        controller = HandController()
+    image = np.zeros((recording.height, recording.width, 3), np.uint8)
+    for _, hands_xyz, labels in recording:
+        if out is not None:
+            composite = controller.render_landmarks(image, hands_xyz, labels)
+            out.write(composite)
+            controller.release_composite(composite)
+        else:
+            controller.apply_gestures(hands_xyz, labels, image)
+    return controller
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay a landmark recording through the gesture logic"
+    )
+    parser.add_argument("recordings", nargs="+")
+    args = parser.parse_args()
+    for path in args.recordings:
+        start = time.perf_counter()
+        controller = replay(path)
+        elapsed = time.perf_counter() - start
+        frames = len(LandmarkRecording(path))
+        print(
+            "{}: {} frames in {:.2f} s ({:.0f} fps), zoom {:.1f}, rotation {:.1f}, {} drawn points".format(
+                path,
+                frames,
+                elapsed,
+                frames / elapsed if elapsed > 0 else 0.0,
+                controller.transform.zoom_scale,
+                controller.transform.angle,
+                controller.canvas.num_points,
+            )
+        )
@@ -0,0 +1,75 @@
+import cv2
+import numpy as np
+
+
+class Letterbox:
+    """Fits frames of one size into another size keeping their aspect ratio, the remaining border is black.
+    Used to run hand tracking on a smaller copy of the display frame and to map the landmarks found on
+    that copy back to the display frame.
+    """
+
+    def __init__(self, src_size, dst_size, interpolation=cv2.INTER_AREA):
+        """
+        Args:
+            src_size ((int, int)): Width and height of the frames to fit
+            dst_size ((int, int)): Width and height of the letterboxed frames
+            interpolation (int): OpenCV interpolation flag used for resizing
+        """
+        self.src_size = tuple(src_size)
+        self.dst_size = tuple(dst_size)
+        self.interpolation = interpolation
+        src_width, src_height = self.src_size
+        dst_width, dst_height = self.dst_size
+        scale = min(dst_width / src_width, dst_height / src_height)
+        self.width = max(1, min(dst_width, int(round(src_width * scale))))
+        self.height = max(1, min(dst_height, int(round(src_height * scale))))
+        self.x = (dst_width - self.width) // 2
+        self.y = (dst_height - self.height) // 2
+
+    def apply(self, image, dst=None):
+        """Method for fitting a frame into the destination size
+
+        Args:
+            image (np.ndarray): Frame of src_size
+            dst (np.ndarray): Buffer of dst_size receiving the result, allocated when None
+
+        Returns:
+            np.ndarray: dst
+        """
+        dst_width, dst_height = self.dst_size
+        if dst is None:
+            dst = np.empty((dst_height, dst_width) + image.shape[2:], image.dtype)
+        x0, y0, x1, y1 = self.x, self.y, self.x + self.width, self.y + self.height
+        dst[:y0] = 0
+        dst[y1:] = 0
+        dst[y0:y1, :x0] = 0
+        dst[y0:y1, x1:] = 0
+        cv2.resize(
+            image,
+            (self.width, self.height),
+            dst=dst[y0:y1, x0:x1],
+            interpolation=self.interpolation,
+        )
+        return dst
+
+    def to_source(self, hands_xyz):
+        """Method for mapping landmarks normalized to the letterboxed frame back to the source frame
+
+        Args:
+            hands_xyz (np.ndarray): (hands, 21, 3) landmarks normalized to dst_size
+
+        Returns:
+            np.ndarray: (hands, 21, 3) landmarks normalized to src_size
+        """
+        dst_width, dst_height = self.dst_size
+        # MediaPipe expresses depth at roughly the same scale as x
+        scale = np.array(
+            [
+                dst_width / self.width,
+                dst_height / self.height,
+                dst_width / self.width,
+            ],
+            np.float32,
+        )
+        offset = np.array([self.x / self.width, self.y / self.height, 0.0], np.float32)
+        return hands_xyz * scale - offset
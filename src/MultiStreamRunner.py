@@ -0,0 +1,310 @@
+import argparse
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+from FramePipeline import FrameQueue, StageStats
+from HandController import HandController
+from InferenceScheduler import InferenceScheduler, mediapipe_detector
+
+
+class StreamSession:
+    """One camera or video handled by a MultiStreamRunner, with its own HandController, and so its own zoom,
+    rotation, drawing and gesture state, and its own mediapipe Hands instance whose tracking follows this
+    stream only.
+    """
+
+    def __init__(self, name, source, controller, drop_frames):
+        """
+        Args:
+            name (str): Stream name, used as window title and in reports
+            source (int or str): Camera index or video file opened with cv2.VideoCapture
+            controller (HandController): Session state, not shared with other streams
+            drop_frames (bool): Replace a frame still waiting for a worker by the newer one (live cameras)
+                instead of pausing capture until a worker took it (video files)
+        """
+        self.name = name
+        self.source = source
+        self.controller = controller
+        self.drop_frames = drop_frames
+        self.hands = None
+        self.pending = None
+        self.busy = False
+        self.queued = False
+        self.finished = False
+        self.captured = 0
+        self.dropped = 0
+        self.stats = StageStats(name)
+        self.output = FrameQueue(1, "drop_oldest", on_drop=controller.release_composite)
+
+
+class MultiStreamRunner:
+    """Serves several cameras or videos from one process.
+
+    Every stream gets a capture thread that keeps at most one frame waiting. A fixed pool of worker threads,
+    sized to the cores by default, runs hand tracking and the gesture logic: a stream with a waiting frame is
+    queued once, workers take streams in turn and a stream goes back to the end of the queue after each
+    frame, so every stream gets its share whatever its frame rate. A stream is processed by one worker at a
+    time, which keeps its frames in order and its Hands instance single threaded, while different streams
+    run in parallel as MediaPipe and OpenCV release the GIL.
+    """
+
+    def __init__(self, workers=None, hands_kwargs=None, controller_kwargs=None):
+        """
+        Args:
+            workers (int): Number of worker threads, defaults to the number of cores
+            hands_kwargs (dict): Keyword arguments of mediapipe Hands
+            controller_kwargs (dict): Keyword arguments of the HandController of each stream
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.hands_kwargs = hands_kwargs or dict(
+            min_detection_confidence=0.7, min_tracking_confidence=0.7
+        )
+        self.controller_kwargs = controller_kwargs or {}
+        self.sessions = []
+        self._ready = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._started_at = None
+
+    def add_stream(self, source, name=None, drop_frames=None):
+        """Method for adding a camera or video before run
+
+        Args:
+            source (int or str): Camera index or video file
+            name (str): Stream name, defaults to the source
+            drop_frames (bool): See StreamSession, defaults to True for cameras and False for files
+
+        Returns:
+            StreamSession: Session of the stream
+        """
+        if drop_frames is None:
+            drop_frames = isinstance(source, int)
+        session = StreamSession(
+            str(source) if name is None else name,
+            source,
+            HandController(**self.controller_kwargs),
+            drop_frames,
+        )
+        self.sessions.append(session)
+        return session
+
+    def _create_hands(self, session):
+        import mediapipe as mp
+
+        controller = session.controller
+        session.hands = mp.solutions.hands.Hands(
+            static_image_mode=controller.roi_tracking, **self.hands_kwargs
+        )
+        if controller.inference_stride > 1 or controller.roi_tracking:
+            controller.scheduler = InferenceScheduler(
+                mediapipe_detector(session.hands),
+                stride=controller.inference_stride,
+                roi=controller.roi_tracking,
+            )
+
+    def _capture(self, session):
+        cap = cv2.VideoCapture(session.source)
+        controller = session.controller
+        if isinstance(session.source, int):
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, controller.image_width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, controller.image_height)
+        try:
+            while not self._stop.is_set() and cap.isOpened():
+                success, frame = cap.read()
+                if not success:
+                    break
+                image = controller.preprocess(frame)
+                replaced = None
+                with self._cond:
+                    if not session.drop_frames:
+                        # Backpressure: wait until a worker took the previous frame
+                        self._cond.wait_for(
+                            lambda: session.pending is None or self._stop.is_set()
+                        )
+                    if session.pending is not None:
+                        session.dropped += 1
+                        replaced = session.pending
+                    session.pending = image
+                    session.captured += 1
+                    self._schedule(session)
+                controller.release_frame(replaced)
+        finally:
+            cap.release()
+            with self._cond:
+                session.finished = True
+                self._cond.notify_all()
+
+    def _schedule(self, session):
+        # Called with self._cond held
+        if session.pending is not None and not session.busy and not session.queued:
+            session.queued = True
+            self._ready.append(session)
+            self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ready or self._stop.is_set())
+                if self._stop.is_set():
+                    return
+                session = self._ready.popleft()
+                session.queued = False
+                session.busy = True
+                image, session.pending = session.pending, None
+                # Capture may be waiting for the slot to be free
+                self._cond.notify_all()
+            try:
+                start = time.perf_counter()
+                controller = session.controller
+                hands_xyz, labels = controller.infer(session.hands, image)
+                session.output.put(controller.render_frame(image, hands_xyz, labels))
+                session.stats.add(time.perf_counter() - start)
+            except Exception as error:
+                print("Failed to process a frame of {}: {}".format(session.name, error))
+            finally:
+                session.controller.release_frame(image)
+                with self._cond:
+                    session.busy = False
+                    self._schedule(session)
+                    self._cond.notify_all()
+
+    def run(self, display=False, report_interval=5.0):
+        """Method for processing every stream until all sources ended or ESC was pressed
+
+        Args:
+            display (bool): Show every stream in its own window, on the calling thread
+            report_interval (float): Seconds between throughput reports, None disables periodic reports
+        """
+        for session in self.sessions:
+            self._create_hands(session)
+        self._stop.clear()
+        self._started_at = time.perf_counter()
+        for session in self.sessions:
+            session.stats = StageStats(session.name)
+        self._threads = [
+            threading.Thread(target=self._capture, args=(session,), daemon=True)
+            for session in self.sessions
+        ]
+        self._threads += [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        last_report = time.perf_counter()
+        try:
+            while not self._done():
+                if display:
+                    for session in self.sessions:
+                        if len(session.output):
+                            composite = session.output.get(timeout=0)
+                            cv2.imshow(session.name, composite)
+                            session.controller.release_composite(composite)
+                    if cv2.waitKey(5) & 0xFF == 27:
+                        break
+                else:
+                    time.sleep(0.05)
+                if (
+                    report_interval is not None
+                    and time.perf_counter() - last_report >= report_interval
+                ):
+                    print(self.report())
+                    last_report = time.perf_counter()
+        finally:
+            self.stop()
+            for session in self.sessions:
+                if session.hands is not None:
+                    session.hands.close()
+            if display:
+                cv2.destroyAllWindows()
+        print(self.report())
+
+    def _done(self):
+        with self._cond:
+            return all(
+                session.finished and session.pending is None and not session.busy
+                for session in self.sessions
+            )
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def stream_report(self):
+        """Method for getting the throughput of each stream
+
+        Returns:
+            List of dict: Name, frames captured, processed and dropped, and processed frames per second
+        """
+        elapsed = time.perf_counter() - self._started_at if self._started_at else 0.0
+        return [
+            {
+                "name": session.name,
+                "captured": session.captured,
+                "processed": session.stats.frames,
+                "dropped": session.dropped,
+                "fps": session.stats.frames / elapsed if elapsed > 0 else 0.0,
+                "ms_per_frame": (
+                    1000.0 * session.stats.busy_time / session.stats.frames
+                    if session.stats.frames
+                    else 0.0
+                ),
+            }
+            for session in self.sessions
+        ]
+
+    def report(self):
+        """Method for summarising per stream and aggregate throughput
+
+        Returns:
+            str: Human readable report
+        """
+        streams = self.stream_report()
+        lines = [
+            "{name}: {fps:.1f} fps, {ms_per_frame:.1f} ms/frame, {processed} processed, "
+            "{dropped} dropped".format(**stream)
+            for stream in streams
+        ]
+        lines.append(
+            "all {} streams: {:.1f} fps on {} workers".format(
+                len(streams), sum(stream["fps"] for stream in streams), self.workers
+            )
+        )
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run hand gesture control on several cameras or videos in one process"
+    )
+    parser.add_argument(
+        "sources", nargs="+", help="Camera indices (e.g. 0 1) or video files"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Defaults to the number of cores"
+    )
+    parser.add_argument(
+        "--display", action="store_true", help="Show every stream in its own window"
+    )
+    parser.add_argument(
+        "--inference-stride",
+        type=int,
+        default=1,
+        help="Run hand tracking every N frames and predict landmarks in between",
+    )
+    args = parser.parse_args()
+    runner = MultiStreamRunner(
+        workers=args.workers,
+        controller_kwargs=dict(inference_stride=args.inference_stride),
+    )
+    for source in args.sources:
+        runner.add_stream(int(source) if source.isdigit() else source)
+    runner.run(display=args.display)
@@ -0,0 +1,294 @@
+"""Serves the frames shown by HandController as MJPEG over HTTP, to be watched in a browser or any MJPEG client.
+
+Published frames are copied once and JPEG encoded on a background thread, at most once per frame for each
+quality level that has viewers. Every viewer of a level is sent the same encoded bytes, so adding viewers
+costs a socket write per frame and no encoding. A viewer always gets the newest encoded frame: a slow
+connection skips the frames it had no time to send instead of queueing them.
+
+    python src/HandController.py --preview 8080
+    http://localhost:8080/                  page showing the stream
+    http://localhost:8080/stream?quality=low   multipart MJPEG stream, high, medium (default) or low
+    http://localhost:8080/snapshot.jpg      next frame as a single JPEG
+"""
+
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+# JPEG quality and scale of the frame for each quality level
+PREVIEW_QUALITIES = {
+    "high": (90, 1.0),
+    "medium": (75, 1.0),
+    "low": (50, 0.5),
+}
+DEFAULT_QUALITY = "medium"
+# Socket send buffer of a stream in bytes, kept to a few frames so that a slow viewer is not fed stale frames
+STREAM_SEND_BUFFER = 256 * 1024
+BOUNDARY = "frame"
+
+_PAGE = (
+    "<!DOCTYPE html><html><head><title>VisualController</title></head>"
+    '<body style="margin:0;background:#000"><img src="/stream?quality={}" '
+    'style="width:100%"></body></html>'
+)
+
+
+class _PreviewHandler(BaseHTTPRequestHandler):
+    # Seconds a stalled viewer may block on a write before being disconnected
+    timeout = 10.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        quality = parse_qs(url.query).get("quality", [DEFAULT_QUALITY])[0]
+        preview = self.server.preview
+        if quality not in preview.qualities:
+            self.send_error(400, "Unknown quality {}".format(quality))
+            return
+        if url.path == "/":
+            body = _PAGE.format(quality).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/snapshot.jpg":
+            jpeg = preview.snapshot(quality)
+            if jpeg is None:
+                self.send_error(503, "No frame")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(jpeg)))
+            self.end_headers()
+            self.wfile.write(jpeg)
+        elif url.path == "/stream":
+            self.send_response(200)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header(
+                "Content-Type",
+                "multipart/x-mixed-replace; boundary={}".format(BOUNDARY),
+            )
+            self.end_headers()
+            self.connection.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, STREAM_SEND_BUFFER
+            )
+            try:
+                for part in preview.parts(quality):
+                    self.connection.sendall(part)
+            except OSError:
+                # Viewer went away or stalled
+                pass
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _PreviewHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Pending connections, the default of 5 refuses viewers joining together
+    request_queue_size = 64
+
+
+class PreviewServer:
+    """MJPEG preview of the frames given to publish, served on a background thread"""
+
+    def __init__(self, port=8080, host="127.0.0.1", qualities=PREVIEW_QUALITIES):
+        """
+        Args:
+            port (int): TCP port, 0 picks a free one, see self.port
+            host (str): Interface to listen on, "0.0.0.0" for viewers on the local network
+            qualities (dict): JPEG quality and scale of each quality level by name
+        """
+        self.qualities = dict(qualities)
+        self.published = 0
+        self.replaced = 0
+        self.encoded = {quality: 0 for quality in self.qualities}
+        self.encode_time = 0.0
+        self.sent = 0
+        self.skipped = 0
+        self._viewers = {quality: 0 for quality in self.qualities}
+        # Latest encoded frame of each level: sequence number, multipart part and JPEG offset in the part
+        self._frames = {quality: (0, None, 0) for quality in self.qualities}
+        self._pending = None
+        self._spare = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        # Same lock, waited on by viewers only so that publishing a frame does not wake them
+        self._encoded_cond = threading.Condition(self._cond)
+        self._stopped = False
+        self._server = _PreviewHTTPServer((host, port), _PreviewHandler)
+        self._server.preview = self
+        self.host, self.port = self._server.server_address[:2]
+        self._threads = []
+
+    @property
+    def viewers(self):
+        """int: Number of connected viewers"""
+        return sum(self._viewers.values())
+
+    def start(self):
+        """Method for serving viewers and encoding frames on background threads"""
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, daemon=True),
+            threading.Thread(target=self._encode, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        print("Preview at http://{}:{}/".format(self.host, self.port))
+        return self
+
+    def publish(self, image):
+        """Method for offering a frame to the viewers. Returns at once without copying when nobody watches,
+        and replaces the previous frame when the encoder has not taken it yet.
+
+        Args:
+            image (BGR): Frame, copied so that the caller may reuse its buffer
+        """
+        if not self.viewers:
+            return
+        with self._cond:
+            self.published += 1
+            buffer = self._pending
+            if buffer is not None:
+                self.replaced += 1
+            else:
+                buffer, self._spare = self._spare, None
+            if buffer is None or buffer.shape != image.shape:
+                buffer = np.empty_like(image)
+            np.copyto(buffer, image)
+            self._pending = buffer
+            self._cond.notify_all()
+
+    def _encode(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._stopped)
+                if self._stopped:
+                    return
+                image, self._pending = self._pending, None
+                self._seq += 1
+                seq = self._seq
+                watched = [quality for quality, count in self._viewers.items() if count]
+            start = time.perf_counter()
+            parts = {}
+            for quality in watched:
+                jpeg_quality, scale = self.qualities[quality]
+                scaled = image
+                if scale != 1.0:
+                    scaled = cv2.resize(
+                        image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+                    )
+                success, jpeg = cv2.imencode(
+                    ".jpg", scaled, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+                )
+                if not success:
+                    continue
+                header = "--{}\r\nContent-Type: image/jpeg\r\nContent-Length: {}\r\n\r\n".format(
+                    BOUNDARY, jpeg.size
+                ).encode()
+                parts[quality] = (seq, b"".join((header, jpeg, b"\r\n")), len(header))
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self.encode_time += elapsed
+                for quality, frame in parts.items():
+                    self.encoded[quality] += 1
+                    self._frames[quality] = frame
+                if self._spare is None:
+                    self._spare = image
+                self._encoded_cond.notify_all()
+
+    def parts(self, quality=DEFAULT_QUALITY):
+        """Method for following the encoded frames of a quality level, as run by each stream viewer. Frames
+        encoded while the previous one was being sent are skipped.
+
+        Args:
+            quality (str): Quality level
+
+        Yields:
+            bytes: Multipart part holding the newest JPEG, shared with the other viewers of the level
+        """
+        with self._cond:
+            self._viewers[quality] += 1
+            last_seq = self._frames[quality][0]
+        try:
+            while True:
+                with self._cond:
+                    self._encoded_cond.wait_for(
+                        lambda: self._frames[quality][0] != last_seq or self._stopped
+                    )
+                    if self._stopped:
+                        return
+                    seq, part, _ = self._frames[quality]
+                    if last_seq:
+                        self.skipped += max(0, seq - last_seq - 1)
+                    last_seq = seq
+                    self.sent += 1
+                yield part
+        finally:
+            with self._cond:
+                self._viewers[quality] -= 1
+
+    def snapshot(self, quality=DEFAULT_QUALITY, timeout=5.0):
+        """Method for waiting for the next frame encoded at a quality level
+
+        Returns:
+            memoryview: JPEG data, None when no frame was published within timeout seconds
+        """
+        with self._cond:
+            self._viewers[quality] += 1
+            last_seq = self._frames[quality][0]
+            try:
+                self._encoded_cond.wait_for(
+                    lambda: self._frames[quality][0] != last_seq or self._stopped,
+                    timeout,
+                )
+            finally:
+                self._viewers[quality] -= 1
+            _, part, offset = self._frames[quality]
+            if part is None or self._frames[quality][0] == last_seq:
+                return None
+        return memoryview(part)[offset:-2]
+
+    def report(self):
+        """Method for summarising encoding and sending
+
+        Returns:
+            str: Human readable report
+        """
+        encoded = sum(self.encoded.values())
+        return (
+            "{} frames published, {} replaced before encoding, {} encoded in {:.1f} ms each, "
+            "{} sent, {} skipped by slow viewers, {} viewers".format(
+                self.published,
+                self.replaced,
+                encoded,
+                1000.0 * self.encode_time / encoded if encoded else 0.0,
+                self.sent,
+                self.skipped,
+                self.viewers,
+            )
+        )
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            self._encoded_cond.notify_all()
+        if self._threads:
+            self._server.shutdown()
+        self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
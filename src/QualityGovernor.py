@@ -0,0 +1,202 @@
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+# model_complexity: MediaPipe hand model, 0 lite, 1 full, None keeps the MediaPipe default
+# inference_stride: run hand tracking at most every N frames, see InferenceScheduler
+# inference_scale: size of the hand tracking copy relative to the inference or display size
+# draw_joints, draw_skeleton: optional parts of ImageUtils.draw_hand_landmarks, the bounding box always shows
+QualityLevel = namedtuple(
+    "QualityLevel",
+    [
+        "name",
+        "model_complexity",
+        "inference_stride",
+        "inference_scale",
+        "draw_joints",
+        "draw_skeleton",
+    ],
+)
+
+# From the most to the least expensive, each level keeps the savings of the previous one
+QUALITY_LEVELS = (
+    QualityLevel("full", 1, 1, 1.0, True, True),
+    QualityLevel("lite model", 0, 1, 1.0, True, True),
+    QualityLevel("alternate frames", 0, 2, 1.0, True, True),
+    QualityLevel("half resolution", 0, 2, 0.5, True, True),
+    QualityLevel("minimal", 0, 3, 0.5, False, False),
+)
+
+
+def without_model_complexity(levels):
+    """Method for adapting quality levels to a MediaPipe version with a single hand model
+
+    Args:
+        levels (List of QualityLevel): Quality levels
+
+    Returns:
+        tuple of QualityLevel: Levels keeping the default model, without the levels that no longer differ
+            from the previous one
+    """
+    adapted = []
+    for level in levels:
+        level = level._replace(model_complexity=None)
+        if adapted and level[1:] == adapted[-1][1:]:
+            continue
+        adapted.append(level)
+    return tuple(adapted)
+
+
+class QualityGovernor:
+    """Keeps the frame loop at a target frame rate by trading tracking and rendering quality for time.
+
+    The median frame time of the last window frames is compared with the frame budget. Above budget *
+    tolerance the governor steps down one level, below budget * headroom it steps back up, and the band in
+    between keeps the current level. After every change the window starts over, so each decision only sees
+    frames of the current level, and a step up waits for upgrade_wait frames at the lower level. A step up
+    that has to be undone within two windows doubles that wait, up to max_upgrade_wait, so that a level the
+    machine cannot sustain is not retried every second.
+    """
+
+    def __init__(
+        self,
+        target_fps=30.0,
+        levels=QUALITY_LEVELS,
+        window=30,
+        tolerance=1.1,
+        headroom=0.7,
+        upgrade_wait=60,
+        max_upgrade_wait=1800,
+        history=100,
+    ):
+        """
+        Args:
+            target_fps (float): Frame rate to sustain
+            levels (List of QualityLevel): Quality levels from the most to the least expensive, starts at the
+                first one
+            window (int): Frames whose median frame time drives each decision
+            tolerance (float): Step down when the median exceeds the budget by this factor
+            headroom (float): Step up when the median is below this fraction of the budget
+            upgrade_wait (int): Frames to spend at a level before stepping up
+            max_upgrade_wait (int): Upper bound of upgrade_wait after failed steps up
+            history (int): Number of decisions kept in self.decisions
+        """
+        self.target_fps = target_fps
+        self.budget = 1.0 / target_fps
+        self.levels = tuple(levels)
+        self.window = window
+        self.tolerance = tolerance
+        self.headroom = headroom
+        self.min_upgrade_wait = upgrade_wait
+        self.max_upgrade_wait = max_upgrade_wait
+        self.upgrade_wait = upgrade_wait
+        self.decisions = deque(maxlen=history)
+        self.level_index = 0
+        self.frames = 0
+        self.changes = 0
+        self._times = np.empty(window)
+        self._count = 0
+        self._frames_at_level = 0
+        self._upgraded_at = None
+
+    @property
+    def level(self):
+        """QualityLevel: Current level"""
+        return self.levels[self.level_index]
+
+    def median_frame_time(self):
+        """Method for getting the median frame time of the current window, None before a full window"""
+        if self._count < self.window:
+            return None
+        return float(np.median(self._times))
+
+    def update(self, frame_time):
+        """Method for adding the time of a frame and deciding on the level
+
+        Args:
+            frame_time (float): Seconds spent on the frame
+
+        Returns:
+            QualityLevel: New level to apply, None when the level did not change
+        """
+        self.frames += 1
+        self._frames_at_level += 1
+        self._times[self._count % self.window] = frame_time
+        self._count += 1
+        median = self.median_frame_time()
+        if median is None:
+            return None
+        if median > self.budget * self.tolerance:
+            if self.level_index + 1 >= len(self.levels):
+                return None
+            if (
+                self._upgraded_at is not None
+                and self.frames - self._upgraded_at <= 2 * self.window
+            ):
+                self.upgrade_wait = min(2 * self.upgrade_wait, self.max_upgrade_wait)
+            else:
+                self.upgrade_wait = self.min_upgrade_wait
+            self._upgraded_at = None
+            return self._change(self.level_index + 1, median, "over budget")
+        if (
+            median < self.budget * self.headroom
+            and self.level_index > 0
+            and self._frames_at_level >= self.upgrade_wait
+        ):
+            self._upgraded_at = self.frames
+            return self._change(self.level_index - 1, median, "headroom")
+        return None
+
+    def _change(self, index, median, reason):
+        previous = self.level
+        self.level_index = index
+        self.changes += 1
+        self._count = 0
+        self._frames_at_level = 0
+        self.decisions.append(
+            {
+                "time": time.time(),
+                "frame": self.frames,
+                "from": previous.name,
+                "to": self.level.name,
+                "reason": reason,
+                "frame_ms": 1000.0 * median,
+                "budget_ms": 1000.0 * self.budget,
+            }
+        )
+        return self.level
+
+    def snapshot(self):
+        """Method for getting the state of the governor for monitoring
+
+        Returns:
+            dict: Current level, its index, median frame time and budget in ms, changes and recent decisions
+        """
+        median = self.median_frame_time()
+        return {
+            "level": self.level.name,
+            "level_index": self.level_index,
+            "levels": len(self.levels),
+            "frame_ms": None if median is None else 1000.0 * median,
+            "budget_ms": 1000.0 * self.budget,
+            "frames": self.frames,
+            "changes": self.changes,
+            "upgrade_wait": self.upgrade_wait,
+            "decisions": list(self.decisions),
+        }
+
+    def report(self):
+        """Method for summarising the current level and the number of changes
+
+        Returns:
+            str: Human readable report
+        """
+        return "level {} ({}/{}), {} changes in {} frames at {:.0f} fps target".format(
+            self.level.name,
+            self.level_index + 1,
+            len(self.levels),
+            self.changes,
+            self.frames,
+            self.target_fps,
+        )
@@ -0,0 +1,109 @@
+import cv2
+import numpy as np
+
+
+class TransformEngine:
+    """Keeps the zoom, rotation and pan applied to the webcam feed and renders them with a single warp.
+
+    The three parameters are combined into one 2x3 affine matrix about the image center, which is only
+    recomputed when a parameter or the image size changes. Frames are warped into a preallocated buffer
+    and returned untouched when the transform is the identity.
+    """
+
+    def __init__(self, max_zoom=49, interpolation=cv2.INTER_LINEAR):
+        """
+        Args:
+            max_zoom (float): Upper bound of zoom_scale, see ImageUtils.zoom_image
+            interpolation (int): cv2 interpolation flag used by the warp
+        """
+        self.max_zoom = max_zoom
+        self.interpolation = interpolation
+        self.zoom_scale = 0.0
+        self.angle = 0.0
+        self.pan = (0.0, 0.0)
+        self._matrix_key = None
+        self._matrix = None
+        self._dst = None
+
+    def reset(self):
+        self.zoom_scale = 0.0
+        self.angle = 0.0
+        self.pan = (0.0, 0.0)
+
+    def add_zoom(self, scale):
+        """Method for zooming in (positive) or out (negative) the same way as ImageUtils.zoom_image
+
+        Args:
+            scale (float): Percentage of the frame cropped from each side, accumulated and clamped
+        """
+        self.zoom_scale = min(max(self.zoom_scale + scale, 0), self.max_zoom)
+
+    def set_rotation(self, degrees):
+        self.angle = degrees
+
+    def set_pan(self, dx, dy):
+        """Method for shifting the output
+
+        Args:
+            dx (float): Horizontal shift in pixels
+            dy (float): Vertical shift in pixels
+        """
+        self.pan = (dx, dy)
+
+    @property
+    def scale(self):
+        """Magnification matching a center crop of zoom_scale percent per side resized to the full frame"""
+        return 1.0 / (1.0 - self.zoom_scale / 50.0)
+
+    @property
+    def is_identity(self):
+        return self.zoom_scale == 0 and self.angle % 360 == 0 and self.pan == (0, 0)
+
+    def get_matrix(self, width, height):
+        """Method for getting the combined affine matrix, cached until a parameter changes
+
+        Args:
+            width (int): Image width
+            height (int): Image height
+
+        Returns:
+            np.ndarray: 2x3 float64 affine matrix mapping source to destination pixels
+        """
+        key = (width, height, self.zoom_scale, self.angle, self.pan)
+        if key != self._matrix_key:
+            matrix = cv2.getRotationMatrix2D(
+                (width / 2, height / 2), self.angle, self.scale
+            )
+            matrix[:, 2] += self.pan
+            self._matrix = matrix
+            self._matrix_key = key
+        return self._matrix
+
+    def apply(self, image, dst=None):
+        """Method for rendering the current transform
+
+        Args:
+            image (BGR): Webcam frame
+            dst (BGR): Buffer of the same size receiving the result, e.g. a view into a larger frame
+
+        Returns:
+            BGR Image: dst when given. Otherwise image itself for the identity transform, or the warped frame
+                held in a buffer that is reused by the next call
+        """
+        if self.is_identity:
+            if dst is None:
+                return image
+            np.copyto(dst, image)
+            return dst
+        height, width = image.shape[:2]
+        if dst is None:
+            if self._dst is None or self._dst.shape != image.shape:
+                self._dst = np.empty_like(image)
+            dst = self._dst
+        return cv2.warpAffine(
+            image,
+            self.get_matrix(width, height),
+            (width, height),
+            dst=dst,
+            flags=self.interpolation,
+        )
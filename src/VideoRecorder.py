@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from collections import deque
+from queue import Empty
+
+import cv2
+import numpy as np
+from FramePipeline import FrameQueue
+
+SOURCES = ("composite", "camera", "panel")
+
+
+class VideoRecorder:
+    """Records rendered frames to video files on a background thread.
+
+    write() only copies the frame into a recycled buffer and queues it, encoding happens on the recorder
+    thread. When the encoder falls behind, frames are dropped according to the queue policy instead of
+    stalling the caller. Frames are stamped when written and resampled to a constant frame rate, repeating or
+    skipping frames, so that playback speed matches real time whatever rate the capture loop reaches.
+    Recording is split in numbered segments once a segment reaches max_seconds or max_bytes.
+    """
+
+    def __init__(
+        self,
+        path="output.avi",
+        fps=20.0,
+        fourcc="XVID",
+        source="composite",
+        queue_size=8,
+        policy="drop_oldest",
+        max_seconds=None,
+        max_bytes=None,
+    ):
+        """
+        Args:
+            path (str): Output file. With rotation, segments are named <name>_000<ext>, <name>_001<ext>, ...
+            fps (float): Frame rate of the written video
+            fourcc (str): Four character code of the codec
+            source (str): "composite" records the whole frame and "panel" its right half (control panel).
+                "camera" records the frames as given, HandController then writes the camera frame before
+                zoom, rotation and drawing instead of the composite
+            queue_size (int): Frames waiting for the encoder before dropping
+            policy (str): "drop_oldest" or "drop_newest", see FrameQueue
+            max_seconds (float): Start a new segment after this many seconds of video
+            max_bytes (int): Start a new segment once the file reaches this size
+        """
+        if source not in SOURCES:
+            raise ValueError(
+                "Unknown source {}, expected one of {}".format(source, SOURCES)
+            )
+        if policy == "block":
+            raise ValueError("VideoRecorder never blocks, use a drop policy")
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.source = source
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.queue = FrameQueue(queue_size, policy)
+        self.frames = 0
+        self.written = 0
+        self.repeated = 0
+        self.skipped = 0
+        self.segments = []
+        self._free = deque()
+        self._thread = None
+        self._writer = None
+        self._segment_start = None
+        self._segment_frames = 0
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    def write(self, image, timestamp=None):
+        """Method for queueing a frame, never waits for the encoder
+
+        Args:
+            image (BGR): Rendered frame, copied so the caller may reuse it
+            timestamp (float): time.monotonic() of the frame, defaults to now
+
+        Returns:
+            boolean: False if the frame was dropped
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self.source == "panel":
+            image = image[:, image.shape[1] // 2 :]
+        try:
+            frame = self._free.pop()
+            if frame.shape != image.shape:
+                frame = np.empty_like(image)
+        except IndexError:
+            frame = np.empty_like(image)
+        np.copyto(frame, image)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self.frames += 1
+        return self.queue.put((timestamp, frame))
+
+    def _run(self):
+        while True:
+            try:
+                timestamp, frame = self.queue.get()
+            except Empty:
+                break
+            self._encode(timestamp, frame)
+            self._free.append(frame)
+        self._close_segment()
+
+    def _encode(self, timestamp, frame):
+        if self._writer is not None and self._segment_full():
+            self._close_segment()
+        if self._writer is None:
+            self._open_segment(timestamp, frame.shape[1::-1])
+        # Index of the frame in a constant frame rate video starting at the segment start
+        target = int(round((timestamp - self._segment_start) * self.fps))
+        if target < self._segment_frames:
+            self.skipped += 1
+            return
+        repeats = target - self._segment_frames + 1
+        for _ in range(repeats):
+            self._writer.write(frame)
+        self._segment_frames += repeats
+        self.written += repeats
+        self.repeated += repeats - 1
+
+    def _segment_full(self):
+        if self.max_seconds and self._segment_frames >= self.max_seconds * self.fps:
+            return True
+        return bool(self.max_bytes) and (
+            os.path.exists(self.segments[-1])
+            and os.path.getsize(self.segments[-1]) >= self.max_bytes
+        )
+
+    def _open_segment(self, timestamp, size):
+        if self.max_seconds or self.max_bytes:
+            name, ext = os.path.splitext(self.path)
+            path = "{}_{:03d}{}".format(name, len(self.segments), ext)
+        else:
+            path = self.path
+        self._writer = cv2.VideoWriter(
+            path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, size
+        )
+        self.segments.append(path)
+        self._segment_start = timestamp
+        self._segment_frames = 0
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def close(self):
+        """Method for encoding the queued frames and closing the current file"""
+        self.queue.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def report(self):
+        """Method for summarising the recording
+
+        Returns:
+            dict: Frames received, dropped before encoding, written, repeated and skipped by the frame rate
+                conversion, and the segment files
+        """
+        return {
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "written": self.written,
+            "repeated": self.repeated,
+            "skipped": self.skipped,
+            "segments": list(self.segments),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,65 @@
+import numpy as np
+from DrawingCanvas import DrawingCanvas
+
+
+def draw_stroke(canvas, y, x_start=10, x_end=150, step=10):
+    # Zigzag, so that simplifying the finished stroke keeps every point
+    for index, x in enumerate(range(x_start, x_end, step)):
+        canvas.add_point(x, y + 5 * (index % 2))
+    canvas.end_stroke()
+
+
+def test_undo_erases_only_the_last_stroke():
+    canvas = DrawingCanvas(thickness=4)
+    canvas.ensure_size(200, 100)
+    draw_stroke(canvas, 20)
+    first = canvas.mask.copy()
+    draw_stroke(canvas, 60)
+    assert canvas.mask.sum() > first.sum()
+
+    assert canvas.undo()
+    np.testing.assert_array_equal(canvas.mask, first)
+    assert canvas.undo()
+    assert not canvas.mask.any()
+    assert canvas.is_empty
+    assert not canvas.undo()
+
+
+def test_undo_after_bake_keeps_baked_strokes():
+    canvas = DrawingCanvas(thickness=4, epsilon=0.0, max_points=20)
+    canvas.ensure_size(200, 100)
+    # 14 points each, the first stroke is baked once the second one pushes the history past 20 points
+    draw_stroke(canvas, 20)
+    baked = canvas.mask.copy()
+    draw_stroke(canvas, 60)
+    assert len(canvas.strokes) == 1
+    assert canvas.num_points <= canvas.max_points
+
+    assert canvas.undo()
+    np.testing.assert_array_equal(canvas.mask, baked)
+    assert not canvas.is_empty
+    # The baked stroke is part of the layer and can no longer be undone
+    assert not canvas.undo()
+    np.testing.assert_array_equal(canvas.mask, baked)
+
+
+def test_long_stroke_head_is_baked():
+    canvas = DrawingCanvas(thickness=4, epsilon=0.0, max_points=10)
+    canvas.ensure_size(400, 100)
+    for x in range(0, 400, 10):
+        canvas.add_point(x, 50)
+    assert canvas.num_points <= canvas.max_points
+    canvas.undo()
+    # Only the tail kept in the history is erased, the baked head stays drawn
+    assert canvas.mask[:, :100].any()
+    assert not canvas.is_empty
+
+
+def test_clear():
+    canvas = DrawingCanvas()
+    canvas.ensure_size(200, 100)
+    draw_stroke(canvas, 50)
+    canvas.clear()
+    assert canvas.is_empty
+    assert not canvas.mask.any()
+    assert canvas.num_points == 0
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from GestureEventBus import (
+    EventType,
+    GestureEventPublisher,
+    GestureEventSubscriber,
+    private_directory,
+    unix_sockets_available,
+)
+
+pytestmark = pytest.mark.skipif(
+    not unix_sockets_available() or not hasattr(os, "getuid"),
+    reason="needs Unix domain sockets",
+)
+
+
+def test_directory_is_created_private(tmp_path):
+    directory = str(tmp_path / "events")
+    private_directory(directory)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+
+
+def test_shared_directory_is_refused(tmp_path):
+    directory = tmp_path / "events"
+    directory.mkdir()
+    directory.chmod(0o777)
+    with pytest.raises(PermissionError):
+        GestureEventSubscriber(str(directory))
+    with pytest.raises(PermissionError):
+        GestureEventPublisher(str(directory))
+
+
+def test_symbolic_link_is_refused(tmp_path):
+    target = tmp_path / "target"
+    target.mkdir(mode=0o700)
+    link = tmp_path / "events"
+    link.symlink_to(target)
+    with pytest.raises(PermissionError):
+        private_directory(str(link))
+
+
+def test_events_reach_subscriber(tmp_path):
+    directory = str(tmp_path / "events")
+    with GestureEventSubscriber(directory) as subscriber:
+        publisher = GestureEventPublisher(directory)
+        publisher.publish(EventType.ROTATE, a=15.0)
+        publisher.close()
+        event = subscriber.receive(timeout=1.0)
+    assert event.type is EventType.ROTATE
+    assert event.values[0] == 15.0
+    assert event.seq == 1
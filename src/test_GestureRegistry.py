@@ -0,0 +1,74 @@
+from enum import Enum
+
+import numpy as np
+import pytest
+from Gesture_util import HandGesture, default_registry
+from GestureRegistry import NUM_MASKS, GestureRegistry, finger_mask, pattern_masks
+
+
+class Custom(Enum):
+    PINCH = 100
+
+
+def chain_gesture(closed):
+    """The if/elif chain GestureUtil.determine_gesture used before the GestureRegistry"""
+    thumb, index, middle, ring, pinky = closed
+    if thumb and index and middle and ring and pinky:
+        return HandGesture.CLOSE
+    elif not thumb and not index and middle and ring and pinky:
+        return HandGesture.ZOOM
+    elif not thumb and not index and not middle and ring and pinky:
+        return HandGesture.ROTATE
+    elif thumb and middle and ring and pinky and not index:
+        return HandGesture.DRAW
+    else:
+        return HandGesture.OPEN
+
+
+ALL_CLOSED = [[bool(mask & 1 << finger) for finger in range(5)] for mask in range(32)]
+
+
+def test_finger_mask_packs_thumb_first():
+    closed = np.array(ALL_CLOSED)
+    np.testing.assert_array_equal(finger_mask(closed), np.arange(NUM_MASKS))
+
+
+@pytest.mark.parametrize("mask", range(NUM_MASKS))
+def test_compiled_table_matches_chain(mask):
+    registry = default_registry()
+    assert registry.classify(mask) is chain_gesture(ALL_CLOSED[mask])
+
+
+def test_classify_batch_matches_chain():
+    registry = default_registry()
+    values = registry.classify_batch(np.arange(NUM_MASKS, dtype=np.uint8))
+    assert [registry.gesture(value) for value in values] == [
+        chain_gesture(closed) for closed in ALL_CLOSED
+    ]
+
+
+def test_pattern_masks():
+    assert pattern_masks("CCCCC") == [31]
+    assert len(pattern_masks("-----")) == NUM_MASKS
+    with pytest.raises(ValueError):
+        pattern_masks("CCX")
+
+
+def test_register_before_unknown_gesture_names_it():
+    registry = GestureRegistry(default=HandGesture.OPEN).register(
+        HandGesture.CLOSE, "CCCCC"
+    )
+    with pytest.raises(ValueError, match="HandGesture.ZOOM"):
+        registry.register(HandGesture.DRAW, "COCCC", before=HandGesture.ZOOM)
+    assert [definition.gesture for definition in registry.definitions] == [
+        HandGesture.CLOSE
+    ]
+
+
+def test_register_before_tries_the_new_gesture_first():
+    registry = default_registry().register(
+        Custom.PINCH, "OOCCC", predicate=lambda landmarks: True, before=HandGesture.ZOOM
+    )
+    zoom_mask = pattern_masks("OOCCC")[0]
+    assert registry.classify(zoom_mask, np.zeros((21, 3))) is Custom.PINCH
+    assert registry.classify(pattern_masks("CCCCC")[0]) is HandGesture.CLOSE
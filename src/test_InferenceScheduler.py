@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from InferenceScheduler import InferenceScheduler
+
+FRAMES = 120
+
+
+class Detector:
+    """Detector returning the same hands on every call and counting the calls"""
+
+    def __init__(self, hands_xyz, labels):
+        self.hands_xyz = hands_xyz
+        self.labels = labels
+        self.calls = 0
+
+    def __call__(self, image):
+        self.calls += 1
+        return self.hands_xyz.copy(), list(self.labels)
+
+
+def one_hand():
+    hand = np.zeros((1, 21, 3), np.float32)
+    hand[0, :, 0] = np.linspace(0.4, 0.6, 21)
+    hand[0, :, 1] = np.linspace(0.3, 0.7, 21)
+    return hand
+
+
+@pytest.mark.parametrize("stride", [1, 2, 3, 4])
+def test_empty_frames_are_skipped(stride):
+    detector = Detector(np.empty((0, 21, 3), np.float32), [])
+    scheduler = InferenceScheduler(detector, stride=stride, roi=False)
+    image = np.zeros((48, 64, 3), np.uint8)
+    for _ in range(FRAMES):
+        hands_xyz, labels = scheduler.process(image)
+        assert hands_xyz.shape == (0, 21, 3)
+        assert labels == []
+    assert scheduler.report()["detection_rate"] == pytest.approx(1 / stride, abs=0.01)
+    assert detector.calls == scheduler.detections
+
+
+@pytest.mark.parametrize("stride", [1, 2, 3, 4])
+def test_still_hands_are_detected_every_stride_frames(stride):
+    detector = Detector(one_hand(), ["Right"])
+    scheduler = InferenceScheduler(detector, stride=stride, roi=False)
+    image = np.zeros((48, 64, 3), np.uint8)
+    for _ in range(FRAMES):
+        hands_xyz, labels = scheduler.process(image)
+        np.testing.assert_allclose(hands_xyz, one_hand())
+        assert labels == ["Right"]
+    assert scheduler.report()["detection_rate"] == pytest.approx(1 / stride, abs=0.01)
+
+
+def test_fast_hands_are_detected_early():
+    detector = Detector(one_hand(), ["Right"])
+    scheduler = InferenceScheduler(detector, stride=4, roi=False, motion_threshold=0.05)
+    image = np.zeros((48, 64, 3), np.uint8)
+    for frame in range(FRAMES):
+        detector.hands_xyz = one_hand() + (0.06 * (frame % 8), 0, 0)
+        scheduler.process(image)
+    assert scheduler.report()["detection_rate"] > 0.5
+
+
+def test_roi_needs_a_stride():
+    with pytest.raises(ValueError):
+        InferenceScheduler(Detector(one_hand(), ["Right"]), stride=1, roi=True)
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from Gesture_util import HandGesture, HandLandmark
+from HandController import HandController
+from LandmarkRecording import LandmarkRecorder, LandmarkRecording, replay
+
+WIDTH, HEIGHT = 640, 480
+
+# Finger closed states (thumb, index, middle, ring, pinky) of each gesture
+GESTURE_FINGERS = {
+    HandGesture.OPEN: (False, False, False, False, False),
+    HandGesture.CLOSE: (True, True, True, True, True),
+    HandGesture.ZOOM: (False, False, True, True, True),
+    HandGesture.ROTATE: (False, False, False, True, True),
+}
+
+
+def make_hand(gesture, center, scale=1.0, angle=0.0):
+    """Method for building (21, 3) landmarks classified as gesture, scaled and rotated around the wrist"""
+    closed = GESTURE_FINGERS[gesture]
+    hand = np.zeros((21, 3), np.float32)
+    thumb_step = 0.03 if closed[0] else -0.03
+    for joint in range(1, 5):
+        hand[joint] = (-0.06 + thumb_step * joint, -0.04 * joint, 0)
+    for finger in range(1, 5):
+        step = 0.03 if closed[finger] else -0.04
+        for joint in range(4):
+            hand[1 + 4 * finger + joint] = (
+                -0.045 + 0.03 * finger,
+                -0.15 + step * joint,
+                -0.01 * joint,
+            )
+    radians = np.radians(angle)
+    rotation = np.array(
+        [[np.cos(radians), -np.sin(radians)], [np.sin(radians), np.cos(radians)]]
+    )
+    hand[:, :2] = scale * hand[:, :2] @ rotation.T + center
+    hand[HandLandmark.WRIST, :2] = center
+    return hand
+
+
+def session():
+    """Method for building the frames of a short session: no hand, then pinching to zoom in and rotating
+    with the left hand closed
+
+    Returns:
+        List of (np.ndarray, List of str): Landmarks and labels of each frame
+    """
+    left = make_hand(HandGesture.CLOSE, (0.25, 0.7))
+    frames = [(np.empty((0, 21, 3), np.float32), [])] * 3
+    for scale in np.linspace(1.6, 1.0, 12):
+        right = make_hand(HandGesture.ZOOM, (0.7, 0.7), scale=scale)
+        frames.append((np.stack([left, right]), ["Left", "Right"]))
+    for angle in np.linspace(0.0, 15.0, 12):
+        right = make_hand(HandGesture.ROTATE, (0.7, 0.7), angle=angle)
+        frames.append((np.stack([left, right]), ["Left", "Right"]))
+    frames.append((left[None], ["Left"]))
+    return frames
+
+
+def run(controller, frames):
+    """Method for feeding frames to a controller
+
+    Returns:
+        List of HandGesture: Right hand gesture after each frame
+    """
+    image = np.zeros((HEIGHT, WIDTH, 3), np.uint8)
+    gestures = []
+    for hands_xyz, labels in frames:
+        controller.apply_gestures(hands_xyz, labels, image)
+        gestures.append(controller.right_hand_gesture)
+    return gestures
+
+
+class GestureLog(HandController):
+    """Controller keeping the right hand gesture of every frame it is given"""
+
+    def __init__(self):
+        super().__init__()
+        self.gestures = []
+
+    def apply_gestures(self, hands_xyz, labels, image, drawable_img=None):
+        result = super().apply_gestures(hands_xyz, labels, image, drawable_img)
+        self.gestures.append(self.right_hand_gesture)
+        return result
+
+
+@pytest.fixture
+def recording_path(tmp_path):
+    path = str(tmp_path / "session.vclm")
+    with LandmarkRecorder(path, WIDTH, HEIGHT) as recorder:
+        for index, (hands_xyz, labels) in enumerate(session()):
+            recorder.write(hands_xyz, labels, timestamp=index / 30.0)
+    return path
+
+
+def test_recording_reads_back_what_was_written(recording_path):
+    frames = session()
+    recording = LandmarkRecording(recording_path)
+    assert isinstance(recording.records, np.memmap)
+    assert (recording.width, recording.height) == (WIDTH, HEIGHT)
+    assert len(recording) == len(frames)
+    np.testing.assert_allclose(recording.timestamps, np.arange(len(frames)) / 30.0)
+    for (_, hands_xyz, labels), (expected_xyz, expected_labels) in zip(
+        recording, frames
+    ):
+        assert labels == expected_labels
+        np.testing.assert_array_equal(hands_xyz, expected_xyz)
+
+
+def test_replay_matches_live_gestures_zoom_and_rotation(recording_path):
+    live = HandController()
+    live_gestures = run(live, session())
+    assert HandGesture.ZOOM in live_gestures
+    assert HandGesture.ROTATE in live_gestures
+    assert live.transform.zoom_scale != 0
+    assert live.transform.angle != 0
+
+    replayed = replay(recording_path, GestureLog())
+    assert replayed.gestures == live_gestures
+    assert replayed.transform.zoom_scale == pytest.approx(live.transform.zoom_scale)
+    assert replayed.transform.angle == pytest.approx(live.transform.angle)
+
+
+def test_partial_record_is_ignored(recording_path):
+    with open(recording_path, "ab") as recording:
+        recording.write(b"\0" * 10)
+    assert len(LandmarkRecording(recording_path)) == len(session())
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a recording" * 8)
+    with pytest.raises(ValueError):
+        LandmarkRecording(str(path))